@@ -0,0 +1,217 @@
+"""
+Background writer for the agent audit tables (agent_logs, nl_queries).
+
+Agents enqueue log rows and return immediately; a daemon thread drains the
+queue and writes rows in batches (one transaction per table per batch;
+large agent_logs batches use COPY). A failed batch is retried row by row,
+so only the bad rows are dropped (and logged). Started and flushed by the
+FastAPI lifespan, and flushed at interpreter exit. When the writer is not
+running (scripts, tests) rows are written synchronously.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import text
+
+from app.database import copy_rows, execute_write, execute_write_batch
+
+
+log = logging.getLogger("agent_logs")
+
+AGENT_LOG_COLUMNS = (
+    "agent_type", "action", "input_data", "output_data",
+    "model_used", "related_to_type", "related_to_id", "success"
+)
+
+# Batches at least this large are written with COPY instead of executemany
+COPY_MIN_ROWS = 50
+
+_Q_INSERT_AGENT_LOG = text("""
+    INSERT INTO agent_logs (
+        agent_type, action, input_data, output_data,
+        model_used, related_to_type, related_to_id, success
+    ) VALUES (
+        :agent_type, :action, :input_data, :output_data,
+        :model_used, :related_to_type, CAST(:related_to_id AS UUID), :success
+    )
+""")
+
+_Q_INSERT_NL_QUERY = text("""
+    INSERT INTO nl_queries (
+        query_text, generated_sql, result_count, user_id, success, error_message,
+        prompt_tokens, cached_tokens
+    ) VALUES (
+        :query_text, :generated_sql, :result_count, CAST(:user_id AS UUID), :success, :error_message,
+        :prompt_tokens, :cached_tokens
+    )
+""")
+
+# Insert statement per queued table
+_INSERTS = {
+    "agent_logs": _Q_INSERT_AGENT_LOG,
+    "nl_queries": _Q_INSERT_NL_QUERY,
+}
+
+
+class AgentLogWriter:
+    """Bounded queue of (table, row) log entries drained by a background thread."""
+    
+    def __init__(self, maxsize: int = 10_000, batch_size: int = 1000, interval: float = 0.1):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.stop)
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> None:
+        """Start the drain thread (idempotent)."""
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="agent-log-writer", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush queued rows and stop the drain thread."""
+        if not self.running:
+            return
+        self._queue.put(None)  # sentinel: drain what's left, then exit
+        self._thread.join(timeout)
+        self._thread = None
+    
+    def put(self, table: str, row: Dict[str, Any]) -> None:
+        """Queue a row for table; written synchronously if the writer isn't running."""
+        if not self.running:
+            self._write([(table, row)])
+            return
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            log.warning("Log queue full, dropping %s row", table)
+    
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Tuple[str, Dict[str, Any]]] = []
+            try:
+                row = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            
+            while True:
+                if row is None:
+                    stopping = True
+                else:
+                    batch.append(row)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            
+            if batch:
+                self._write(batch)
+    
+    def _write(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        rows_by_table: Dict[str, List[Dict[str, Any]]] = {}
+        for table, row in batch:
+            rows_by_table.setdefault(table, []).append(row)
+        
+        # One transaction per table, so one table's failure can't drop the other's rows
+        for table, rows in rows_by_table.items():
+            self._write_table(table, rows)
+    
+    def _write_table(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        """Write rows in one batch; if that fails, retry them one by one."""
+        try:
+            if table == "agent_logs" and len(rows) >= COPY_MIN_ROWS:
+                copy_rows(table, AGENT_LOG_COLUMNS, rows)
+            else:
+                execute_write_batch([(_INSERTS[table], rows)])
+            return
+        except Exception as e:
+            if len(rows) == 1:
+                log.error("Dropped %s row: %s", table, e)
+                log.debug("Dropped %s row data: %r", table, rows[0])
+                return
+            log.warning("%s batch write failed (%d rows), retrying row by row: %s", table, len(rows), e)
+        
+        # Each row in its own transaction: only the rows that fail are lost
+        failed = 0
+        for row in rows:
+            try:
+                execute_write(_INSERTS[table], row)
+            except Exception as e:
+                failed += 1
+                log.error("Dropped %s row: %s", table, e)
+                log.debug("Dropped %s row data: %r", table, row)
+        if failed:
+            log.error("%s: %d of %d rows dropped", table, failed, len(rows))
+
+
+_writer = AgentLogWriter()
+
+
+def _dumps(data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """JSON text for a JSONB column (orjson; non-native values via str())."""
+    return orjson.dumps(data, default=str).decode() if data is not None else None
+
+
+def get_agent_log_writer() -> AgentLogWriter:
+    """Get the process-wide log writer."""
+    return _writer
+
+
+def log_agent_execution(
+    agent_type: str,
+    action: str,
+    input_data: Optional[Dict[str, Any]] = None,
+    output_data: Optional[Dict[str, Any]] = None,
+    model_used: str = "gpt-5.2-chat",
+    related_to_type: Optional[str] = None,
+    related_to_id: Optional[str] = None,
+    success: bool = True
+) -> None:
+    """Record an agent execution in agent_logs without blocking the caller."""
+    _writer.put("agent_logs", {
+        "agent_type": agent_type,
+        "action": action,
+        "input_data": _dumps(input_data),
+        "output_data": _dumps(output_data),
+        "model_used": model_used,
+        "related_to_type": related_to_type,
+        "related_to_id": related_to_id,
+        "success": success
+    })
+
+
+def log_nl_query(
+    query_text: str,
+    generated_sql: Optional[str],
+    result_count: Optional[int],
+    success: bool,
+    error_message: Optional[str] = None,
+    user_id: Optional[str] = None,
+    usage: Optional[Dict[str, int]] = None
+) -> None:
+    """Record a natural language query in nl_queries without blocking the caller."""
+    usage = usage or {}
+    _writer.put("nl_queries", {
+        "query_text": query_text,
+        "generated_sql": generated_sql,
+        "result_count": result_count,
+        "user_id": user_id,
+        "success": success,
+        "error_message": error_message,
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "cached_tokens": usage.get("cached_tokens")
+    })
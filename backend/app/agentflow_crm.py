@@ -10,21 +10,67 @@ This is a clean implementation following AgentFlow's architecture patterns:
 """
 
 import os
+import re
+import sys
+import queue
+import atexit
+import logging
+import math
+import asyncio
+import hashlib
+import threading
 import time
 import json
-from typing import Dict, List, Any, Optional
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+from typing import Dict, List, Any, Optional, Callable, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 
 from app.llm_engine import create_gpt5_engine
-from app.database import execute_query
+from app.database import execute_query, execute_prepared, limit_rows
+
+log = logging.getLogger("agentflow")
+log.addHandler(logging.NullHandler())
+
+_log_listener: Optional[QueueListener] = None
+
+
+def enable_verbose_logging():
+    """
+    Route agentflow DEBUG logs to stdout through a background QueueListener.
+    
+    Worker threads only enqueue records; the stdout write happens on the
+    listener thread, so concurrent solves do not contend on the stdout lock.
+    """
+    global _log_listener
+    
+    if _log_listener is None:
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(logging.Formatter("%(message)s"))
+        _log_listener = QueueListener(log_queue, stream)
+        _log_listener.start()
+        atexit.register(_log_listener.stop)
+        log.addHandler(QueueHandler(log_queue))
+        log.propagate = False
+    
+    log.setLevel(logging.DEBUG)
 
 
 # ============================================
 # MEMORY - Tracks execution history
 # ============================================
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ActionRecord:
     """Single action in the agent's memory."""
     step: int
@@ -32,28 +78,90 @@ class ActionRecord:
     sub_goal: str
     command: str
     result: Any
-    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    timestamp_ns: int = field(default_factory=time.time_ns)
+
+
+def _json_default(obj: Any) -> Any:
+    """Fallback for values orjson cannot encode natively (e.g. Decimal)."""
+    if PYARROW_AVAILABLE and isinstance(obj, pa.Table):
+        return obj.to_pylist()
+    return str(obj)
+
+
+def _compress_result(result: Any) -> Any:
+    """
+    Store result rows column-wise with dictionary-encoded string columns.
+    
+    Repeated categorical values (statuses, company names) collapse to
+    integer codes. Rows Arrow cannot type (e.g. UUIDs) are kept as-is.
+    """
+    if not PYARROW_AVAILABLE or not isinstance(result, dict):
+        return result
+    rows = result.get("results")
+    if not isinstance(rows, list) or not rows or not all(isinstance(r, dict) for r in rows):
+        return result
+    
+    try:
+        table = pa.Table.from_pylist(rows)
+    except (pa.ArrowException, TypeError, ValueError):
+        return result
+    
+    columns = [
+        column.dictionary_encode() if pa.types.is_string(column.type) else column
+        for column in table.columns
+    ]
+    return {**result, "results": pa.Table.from_arrays(columns, names=table.column_names)}
+
+
+def _expand_result(result: Any) -> Any:
+    """Convert a compressed result back to a list of row dicts."""
+    if PYARROW_AVAILABLE and isinstance(result, dict) and isinstance(result.get("results"), pa.Table):
+        return {**result, "results": result["results"].to_pylist()}
+    return result
 
 
 class Memory:
     """
     AgentFlow Memory component.
     Tracks all actions taken during query solving.
+    
+    Each action is also rendered once into a "prompt module" with a stable
+    ID (action_{step}). Context built from the modules is append-only, so
+    every earlier step stays a byte-identical prompt prefix that the
+    provider's prefix cache can reuse instead of re-processing.
     """
     
     def __init__(self):
         self.actions: List[ActionRecord] = []
         self.context: Dict[str, Any] = {}
+        self._modules: Dict[str, str] = {}
+        self._summary = ""
     
     def add_action(self, step: int, tool_name: str, sub_goal: str, command: str, result: Any):
         """Add an action to memory."""
-        self.actions.append(ActionRecord(
+        # Render once from the raw rows; the summary buffer is only ever appended to
+        result_preview = str(result)[:200] if result else "None"
+        
+        record = ActionRecord(
             step=step,
             tool_name=tool_name,
             sub_goal=sub_goal,
             command=command,
-            result=result
-        ))
+            result=_compress_result(result)
+        )
+        self.actions.append(record)
+        
+        module = f"Step {step}: {tool_name} - {sub_goal}\n  Result: {result_preview}"
+        self._modules[f"action_{step}"] = module
+        self._summary = f"{self._summary}\n{module}" if self._summary else module
+    
+    def get_module_ids(self) -> List[str]:
+        """Get the stable prompt-module IDs in step order."""
+        return list(self._modules)
+    
+    def get_module(self, module_id: str) -> str:
+        """Get the rendered text of a single prompt module."""
+        return self._modules[module_id]
     
     def get_actions(self) -> List[Dict]:
         """Get all actions as serializable dicts."""
@@ -63,34 +171,82 @@ class Memory:
                 "tool_name": a.tool_name,
                 "sub_goal": a.sub_goal,
                 "command": a.command,
-                "result": a.result,
-                "timestamp": a.timestamp
+                "result": _expand_result(a.result),
+                "timestamp": datetime.fromtimestamp(a.timestamp_ns / 1e9).isoformat()
             }
             for a in self.actions
         ]
     
+    def to_json(self) -> bytes:
+        """
+        Serialize the action trace straight to JSON bytes.
+        
+        Records are encoded natively by orjson (timestamps stay as
+        timestamp_ns integers), skipping the intermediate dicts built by
+        get_actions().
+        """
+        return orjson.dumps(self.actions, default=_json_default, option=orjson.OPT_NAIVE_UTC)
+    
     def get_context_summary(self) -> str:
         """Get a summary of actions for context."""
-        if not self.actions:
-            return "No actions taken yet."
-        
-        lines = []
-        for a in self.actions:
-            result_preview = str(a.result)[:200] if a.result else "None"
-            lines.append(f"Step {a.step}: {a.tool_name} - {a.sub_goal}\n  Result: {result_preview}")
-        
-        return "\n".join(lines)
+        return self._summary or "No actions taken yet."
     
     def clear(self):
         """Clear memory for new query."""
         self.actions = []
         self.context = {}
+        self._modules = {}
+        self._summary = ""
 
 
 # ============================================
 # TOOLS - CRM Database Tool
 # ============================================
 
+# Compiled once at import; word boundaries avoid flagging columns like created_at
+_SELECT_RE = re.compile(r"\s*SELECT\b", re.IGNORECASE)
+_DANGEROUS_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|DROP|ALTER|CREATE|TRUNCATE)\b", re.IGNORECASE)
+_COUNT_RE = re.compile(r"\s*SELECT\s+COUNT\(", re.IGNORECASE)
+_FENCE = re.compile(r"^```(?:sql|postgres\w*|json)?\s*(.*?)\s*(?:```)?\s*$", re.DOTALL | re.IGNORECASE)
+
+# Maximum rows returned to the caller per query
+MAX_RESULT_ROWS = 100
+
+_TOOL_DESCRIPTION = "Execute SQL SELECT queries against the CRM database"
+
+_SCHEMA_CONTEXT = """
+Available CRM Tables:
+- leads: lead_id, first_name, last_name, company_name, email, lead_status, lead_rating, annual_revenue, ai_score
+- contacts: contact_id, first_name, last_name, account_id, email, title, department
+- accounts: account_id, account_name, industry, annual_revenue, employee_count
+- opportunities: opportunity_id, opportunity_name, account_id, amount, stage, probability, close_date, is_closed, is_won
+- activities: activity_id, activity_type, subject, status, related_to_type, related_to_id
+"""
+
+# Table shapes with a compiled executor (mirrors _SCHEMA_CONTEXT)
+_SCHEMA_TABLES: Dict[str, Tuple[str, ...]] = {
+    "leads": ("lead_id", "first_name", "last_name", "company_name", "email",
+              "lead_status", "lead_rating", "annual_revenue", "ai_score"),
+    "contacts": ("contact_id", "first_name", "last_name", "account_id", "email", "title", "department"),
+    "accounts": ("account_id", "account_name", "industry", "annual_revenue", "employee_count"),
+    "opportunities": ("opportunity_id", "opportunity_name", "account_id", "amount", "stage",
+                      "probability", "close_date", "is_closed", "is_won"),
+    "activities": ("activity_id", "activity_type", "subject", "status", "related_to_type", "related_to_id"),
+}
+_WHERE_UNSAFE_RE = re.compile(r";|--|/\*")
+
+# Materialized views from database/analytics_views.sql (refreshed every 5 min)
+ANALYTICS_VIEWS_CONTEXT = """
+Precomputed aggregate views (refreshed every 5 minutes, prefer them for aggregates):
+- mv_lead_counts_by_status: lead_status, lead_count, avg_ai_score
+  -- prefer mv_lead_counts_by_status for lead count aggregates (SUM(lead_count) for the total)
+- mv_opp_pipeline_by_stage: stage, deal_count, open_deal_count, total_amount, open_amount, weighted_amount, avg_probability
+  -- prefer mv_opp_pipeline_by_stage for pipeline value / deals by stage
+- mv_account_revenue_by_industry: industry, account_count, total_revenue, avg_revenue
+  -- prefer mv_account_revenue_by_industry for revenue or account counts by industry
+"""
+
+
 class CRMDatabaseTool:
     """
     Tool for querying the CRM database.
@@ -99,42 +255,142 @@ class CRMDatabaseTool:
     
     def __init__(self):
         self.tool_name = "crm_database_query"
-        self.tool_description = "Execute SQL SELECT queries against the CRM database"
-        self.schema_context = """
-Available CRM Tables:
-- leads: lead_id, first_name, last_name, company_name, email, lead_status, lead_rating, annual_revenue, ai_score
-- contacts: contact_id, first_name, last_name, account_id, email, title, department
-- accounts: account_id, account_name, industry, annual_revenue, employee_count
-- opportunities: opportunity_id, opportunity_name, account_id, amount, stage, probability, close_date, is_closed, is_won
-- activities: activity_id, activity_type, subject, status, related_to_type, related_to_id
-"""
+        self.tool_description = _TOOL_DESCRIPTION
+        self.schema_context = (
+            _SCHEMA_CONTEXT + ANALYTICS_VIEWS_CONTEXT
+            if self._analytics_views_available() else _SCHEMA_CONTEXT
+        )
+        
+        # One specialized executor per table, with its column list baked in
+        self.executors: Dict[str, Callable[..., Dict[str, Any]]] = {
+            table: self.compile_executor(table, columns)
+            for table, columns in _SCHEMA_TABLES.items()
+        }
+    
+    @staticmethod
+    def _analytics_views_available() -> bool:
+        """Check once whether database/analytics_views.sql has been applied."""
+        try:
+            rows = execute_query(
+                "SELECT to_regclass('mv_lead_counts_by_status') IS NOT NULL AS present", {}
+            )
+            return bool(rows and rows[0]["present"])
+        except Exception:
+            return False
     
     def execute(self, query: str) -> Dict[str, Any]:
         """Execute a SQL query against the CRM database."""
+        error = self._validate(query)
+        if error:
+            return error
+        
+        try:
+            return self._package(query, execute_prepared(self._bound(query)))
+        except Exception as e:
+            return {"success": False, "error": str(e), "query": query}
+    
+    def execute_many(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Execute several SELECT queries in a single database round-trip.
+        
+        Each query's rows are aggregated server-side with json_agg and the
+        result sets come back as one row each of a single UNION ALL
+        statement. Values therefore arrive as JSON types (numbers, strings).
+        If the combined statement fails, queries are retried one by one so
+        each gets its own error.
+        """
+        results: List[Optional[Dict[str, Any]]] = [self._validate(q) for q in queries]
+        pending = [i for i, r in enumerate(results) if r is None]
+        if not pending:
+            return results
+        
+        combined = "\nUNION ALL\n".join(
+            f"SELECT {i} AS idx, (SELECT COALESCE(json_agg(_r), '[]'::json) FROM (\n"
+            f"{self._bound(queries[i])}\n) _r) AS rows"
+            for i in pending
+        )
+        
+        try:
+            for row in execute_query(combined, {}):
+                results[row["idx"]] = self._package(queries[row["idx"]], row["rows"])
+        except Exception:
+            for i in pending:
+                results[i] = self.execute(queries[i])
+        
+        return results
+    
+    def _validate(self, query: str) -> Optional[Dict[str, Any]]:
+        """Return an error result if the query is not an allowed SELECT."""
         if not query:
             return {"success": False, "error": "No query provided"}
         
         # Security: Only allow SELECT queries
-        query_upper = query.strip().upper()
-        if not query_upper.startswith("SELECT"):
+        if not _SELECT_RE.match(query):
             return {"success": False, "error": "Only SELECT queries allowed"}
         
         # Check for dangerous keywords
-        dangerous = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE', 'TRUNCATE']
-        for keyword in dangerous:
-            if keyword in query_upper:
-                return {"success": False, "error": f"Dangerous keyword '{keyword}' not allowed"}
+        match = _DANGEROUS_RE.search(query)
+        if match:
+            return {"success": False, "error": f"Dangerous keyword '{match.group(1).upper()}' not allowed"}
+        
+        return None
+    
+    @staticmethod
+    def _bound(query: str) -> str:
+        """Bound the fetch in SQL; the extra row tells us more were available."""
+        return limit_rows(query, MAX_RESULT_ROWS + 1)
+    
+    @staticmethod
+    def _package(query: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "query": query,
+            "result_count": min(len(results), MAX_RESULT_ROWS),
+            "has_more": len(results) > MAX_RESULT_ROWS,
+            "results": results[:MAX_RESULT_ROWS]
+        }
+    
+    def compile_executor(self, table: str, columns: Tuple[str, ...]) -> Callable[..., Dict[str, Any]]:
+        """
+        Build an executor specialized for one table.
         
+        The SELECT prefix is fixed at compile time, so only the WHERE
+        condition from the planner needs checking before it runs.
+        """
+        prefix = f"SELECT {', '.join(columns)} FROM {table}"
+        
+        def _execute(where: str = "", limit: int = 50) -> Dict[str, Any]:
+            where = str(where or "").strip()
+            if _WHERE_UNSAFE_RE.search(where):
+                return {"success": False, "error": "Invalid WHERE condition"}
+            match = _DANGEROUS_RE.search(where)
+            if match:
+                return {"success": False, "error": f"Dangerous keyword '{match.group(1).upper()}' not allowed"}
+            
+            bound = max(1, min(int(limit), MAX_RESULT_ROWS)) + 1
+            sql = f"{prefix} WHERE {where} LIMIT {bound}" if where else f"{prefix} LIMIT {bound}"
+            try:
+                return self._package(sql, execute_prepared(sql))
+            except Exception as e:
+                return {"success": False, "error": str(e), "query": sql}
+        
+        _execute.__name__ = f"_exec_{table}"
+        return _execute
+    
+    def execute_structured(self, table: str, where: str = "", limit: int = 50) -> Dict[str, Any]:
+        """Run a planner {table, where, limit} spec through the compiled executor."""
+        executor = self.executors.get(table)
+        if executor is None:
+            return {"success": False, "error": f"Unknown table: {table}"}
         try:
-            results = execute_query(query, {})
-            return {
-                "success": True,
-                "query": query,
-                "result_count": len(results),
-                "results": results[:100]
-            }
-        except Exception as e:
-            return {"success": False, "error": str(e), "query": query}
+            limit = int(limit)
+        except (TypeError, ValueError):
+            limit = 50
+        return executor(where, limit)
+    
+    async def execute_async(self, query: str) -> Dict[str, Any]:
+        """Run execute() in a worker thread so the event loop stays free."""
+        return await asyncio.to_thread(self.execute, query)
     
     def get_metadata(self) -> Dict:
         """Get tool metadata for the planner."""
@@ -145,72 +401,329 @@ Available CRM Tables:
         }
 
 
+def _strip_fence(response: str) -> str:
+    """Strip a ```sql / ```json markdown fence from an LLM response."""
+    text = response.strip()
+    match = _FENCE.match(text)
+    return (match.group(1) if match else text).strip()
+
+
 # ============================================
-# PLANNER - Query Analysis & Action Planning
+# SQL CACHE - Reuse generated SQL across queries
 # ============================================
 
-class Planner:
+class SQLCache:
     """
-    AgentFlow Planner component.
-    Analyzes queries and generates action plans.
+    NL→SQL cache keyed by the normalized question.
+    
+    The exact layer is an LRU on the lowercased, whitespace-collapsed query.
+    An optional semantic layer matches paraphrases by embedding cosine
+    similarity. Entries are dropped whenever the schema version changes.
     """
     
-    def __init__(self, llm_engine, tools: Dict[str, Any], verbose: bool = True):
-        self.llm = llm_engine
-        self.tools = tools
-        self.verbose = verbose
+    def __init__(
+        self,
+        max_size: int = 512,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+        similarity_threshold: float = 0.95
+    ):
+        self.max_size = max_size
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.schema_version: Optional[str] = None
+        self._exact: "OrderedDict[str, str]" = OrderedDict()
+        self._vectors: List[Tuple[List[float], float, str]] = []
+        self._lock = threading.Lock()
+    
+    @property
+    def semantic(self) -> bool:
+        """Whether lookups may call the embedding model."""
+        return self.embed_fn is not None
+    
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize a question for exact matching."""
+        return " ".join(query.strip().lower().split())
+    
+    def set_schema_version(self, version: str):
+        """Record the schema version, invalidating entries if it changed."""
+        with self._lock:
+            if version != self.schema_version:
+                self.schema_version = version
+                self._exact.clear()
+                self._vectors.clear()
+    
+    def get(self, query: str) -> Optional[str]:
+        """Return cached SQL for the query, or None on a miss."""
+        key = self.normalize(query)
+        with self._lock:
+            sql = self._exact.get(key)
+            if sql is not None:
+                self._exact.move_to_end(key)
+                return sql
+            if not self._vectors:
+                return None
+        
+        vector = self._embed(key)
+        if vector is None:
+            return None
+        
+        best_sql, best_score = None, self.similarity_threshold
+        with self._lock:
+            for other, other_norm, other_sql in self._vectors:
+                score = _cosine(vector, other, other_norm)
+                if score >= best_score:
+                    best_sql, best_score = other_sql, score
+        return best_sql
     
-    def analyze_query(self, query: str) -> Dict[str, Any]:
-        """Analyze the user query and determine approach."""
+    def put(self, query: str, sql: str):
+        """Store generated SQL for the query."""
+        key = self.normalize(query)
+        with self._lock:
+            known = key in self._exact
+            self._exact[key] = sql
+            self._exact.move_to_end(key)
+            if len(self._exact) > self.max_size:
+                self._exact.popitem(last=False)
         
-        prompt = f"""Analyze this CRM query and plan how to answer it:
+        if known or not self.semantic:
+            return
+        vector = self._embed(key)
+        if vector is not None:
+            with self._lock:
+                self._vectors.append((vector, math.sqrt(sum(x * x for x in vector)), sql))
+                if len(self._vectors) > self.max_size:
+                    self._vectors.pop(0)
+    
+    def _embed(self, text: str) -> Optional[List[float]]:
+        if self.embed_fn is None:
+            return None
+        try:
+            return self.embed_fn(text)
+        except Exception as e:
+            log.warning("⚠️ SQL cache embedding failed: %.100s", e)
+            return None
+    
+    def clear(self):
+        """Drop all cached entries."""
+        with self._lock:
+            self._exact.clear()
+            self._vectors.clear()
+
+
+def _cosine(a: List[float], b: List[float], b_norm: float) -> float:
+    """Cosine similarity with a precomputed norm for b."""
+    a_norm = math.sqrt(sum(x * x for x in a))
+    if not a_norm or not b_norm:
+        return 0.0
+    return sum(x * y for x, y in zip(a, b)) / (a_norm * b_norm)
+
+
+# ============================================
+# PLANNER - Query Analysis & Action Planning
+# ============================================
+
+# Static prompt text around the schema block. Each system prompt is built
+# once per Planner so it is byte-identical across calls (prefix caching).
+_RULES = """Rules:
+- Use appropriate JOINs when needed
+- Add LIMIT 50 by default
+- Use ILIKE for text searches"""
 
-Query: "{query}"
+_PLAN_PREFIX = """Analyze CRM queries and plan how to answer them with one PostgreSQL SELECT query.
 
 Available tool: crm_database_query - Execute SQL SELECT queries
-{self.tools['crm_database_query'].schema_context}
+"""
 
-Respond with:
-1. INTENT: What the user wants to know
-2. APPROACH: How to answer using the database
-3. SQL: The exact SQL query to run
+_PLAN_SUFFIX = "\n" + _RULES + """
 
-Keep response concise."""
+Respond as JSON only: {"intent": "...", "approach": "...", "sql": "..."}
+For a plain single-table lookup (no joins or aggregates) also include
+"table", "where" (the condition without the WHERE keyword, "" for none) and "limit"."""
 
-        response = self.llm.generate(prompt)
-        
-        return {
-            "query": query,
-            "analysis": response
-        }
-    
-    def generate_sql(self, query: str, context: str = "") -> str:
-        """Generate SQL from natural language query."""
-        
-        prompt = f"""Convert this question to a PostgreSQL SELECT query:
+_BATCH_PREFIX = """Convert each numbered CRM question to a PostgreSQL SELECT query.
 
-Question: "{query}"
-{context}
+"""
+
+_BATCH_SUFFIX = "\n" + _RULES + """
+
+Respond as a JSON array only: [{"idx": 1, "sql": "..."}, ...]"""
+
+_SQL_PREFIX = """Convert questions to a PostgreSQL SELECT query.
 
-{self.tools['crm_database_query'].schema_context}
+"""
 
+_SQL_SUFFIX = """
 Rules:
 - Return ONLY the SQL query, no explanations
 - Use appropriate JOINs when needed
 - Add LIMIT 50 by default
-- Use ILIKE for text searches
+- Use ILIKE for text searches"""
+
+
+class Planner:
+    """
+    AgentFlow Planner component.
+    Analyzes queries and generates action plans.
+    """
+    
+    def __init__(
+        self,
+        llm_engine,
+        tools: Dict[str, Any],
+        verbose: bool = True,
+        sql_cache: Optional[SQLCache] = None
+    ):
+        self.llm = llm_engine
+        self.tools = tools
+        self.verbose = verbose
+        self.sql_cache = sql_cache
+        
+        schema = self.tools['crm_database_query'].schema_context
+        self._plan_system_prompt = _PLAN_PREFIX + schema + _PLAN_SUFFIX
+        self._batch_system_prompt = _BATCH_PREFIX + schema + _BATCH_SUFFIX
+        self._sql_system_prompt = _SQL_PREFIX + schema + _SQL_SUFFIX
+        
+        if self.sql_cache is not None:
+            self.sql_cache.set_schema_version(hashlib.sha1(schema.encode()).hexdigest()[:12])
+    
+    def _cached_plan(self, query: str, sql: str) -> Dict[str, Any]:
+        """Plan returned for a cache hit."""
+        log.debug("   ⚡ SQL cache hit")
+        return {"intent": "", "approach": "cached", "sql": sql, "query": query, "cached": True}
+    
+    def _cache_get(self, query: str) -> Optional[str]:
+        return self.sql_cache.get(query) if self.sql_cache is not None else None
+    
+    def cache_sql(self, query: str, sql: str):
+        """
+        Remember SQL for a question. Called by the solver only after the SQL
+        executed successfully, so failed SQL and LLM errors are never served.
+        """
+        if self.sql_cache is not None and sql and not sql.startswith("[LLM Unavailable"):
+            self.sql_cache.put(query, sql)
+    
+    async def _cache_get_async(self, query: str) -> Optional[str]:
+        if self.sql_cache is None:
+            return None
+        if self.sql_cache.semantic:
+            return await asyncio.to_thread(self.sql_cache.get, query)
+        return self.sql_cache.get(query)
+    
+    async def cache_sql_async(self, query: str, sql: str):
+        """Async variant of cache_sql()."""
+        if self.sql_cache is not None and self.sql_cache.semantic:
+            await asyncio.to_thread(self.cache_sql, query, sql)
+        else:
+            self.cache_sql(query, sql)
+    
+    def plan(self, query: str) -> Dict[str, Any]:
+        """Analyze the query and generate its SQL in a single LLM call."""
+        cached = self._cache_get(query)
+        if cached:
+            return self._cached_plan(query, cached)
+        
+        response = self.llm.generate(f'Query: "{query}"', system_prompt=self._plan_system_prompt)
+        
+        plan = self._finish_plan(query, response)
+        if not plan["sql"]:
+            # Unparseable plan - fall back to a dedicated SQL generation call
+            plan["sql"] = self.generate_sql(query)
+        return plan
+    
+    async def plan_async(self, query: str) -> Dict[str, Any]:
+        """Async variant of plan()."""
+        cached = await self._cache_get_async(query)
+        if cached:
+            return self._cached_plan(query, cached)
+        
+        response = await self.llm.agenerate(f'Query: "{query}"', system_prompt=self._plan_system_prompt)
+        
+        plan = self._finish_plan(query, response)
+        if not plan["sql"]:
+            plan["sql"] = await asyncio.to_thread(self.generate_sql, query)
+        return plan
+    
+    async def plan_batch(self, queries: List[str]) -> List[str]:
+        """Generate SQL for several independent queries in one LLM call."""
+        sqls = [await self._cache_get_async(q) or "" for q in queries]
+        misses = [i for i, sql in enumerate(sqls) if not sql]
+        if not misses:
+            return sqls
+        
+        prompt = "\n".join(f'Q{n}: "{queries[i]}"' for n, i in enumerate(misses, 1))
+        response = await self.llm.agenerate(prompt, system_prompt=self._batch_system_prompt)
+        
+        text = _strip_fence(response)
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError:
+            match = re.search(r"\[.*\]", text, re.DOTALL)
+            try:
+                items = json.loads(match.group(0)) if match else []
+            except json.JSONDecodeError:
+                items = []
+        
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            try:
+                idx = int(item.get("idx", 0)) - 1
+            except (TypeError, ValueError):
+                continue
+            sql = str(item.get("sql") or "").strip()
+            if 0 <= idx < len(misses) and sql:
+                sql = sql if sql.endswith(';') else sql + ';'
+                sqls[misses[idx]] = sql
+        
+        return sqls
+    
+    def _finish_plan(self, query: str, response: str) -> Dict[str, Any]:
+        """Parse a planner response and normalize its SQL."""
+        plan = self._parse_plan(response)
+        sql = str(plan.get("sql") or "").strip()
+        if sql and not sql.endswith(';'):
+            sql += ';'
+        plan["sql"] = sql
+        plan["query"] = query
+        return plan
+    
+    def _parse_plan(self, response: str) -> Dict[str, Any]:
+        """Parse the planner's JSON response, tolerating ``` fences."""
+        text = _strip_fence(response)
+        
+        try:
+            plan = json.loads(text)
+            if isinstance(plan, dict):
+                return plan
+        except json.JSONDecodeError:
+            pass
+        
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if match:
+            try:
+                return json.loads(match.group(0))
+            except json.JSONDecodeError:
+                pass
+        
+        return {"intent": "", "approach": "", "sql": ""}
+    
+    def generate_sql(self, query: str, context: str = "") -> str:
+        """Generate SQL from natural language query."""
+        if not context:
+            cached = self._cache_get(query)
+            if cached:
+                return cached
+        
+        prompt = f"""Question: "{query}"
+{context}
 
 SQL:"""
 
-        response = self.llm.generate(prompt)
+        response = self.llm.generate(prompt, system_prompt=self._sql_system_prompt)
         
         # Clean response
-        sql = response.strip()
-        if sql.startswith("```"):
-            sql = sql.split("```")[1]
-            if sql.startswith("sql"):
-                sql = sql[3:]
-        sql = sql.strip()
+        sql = _strip_fence(response)
         
         if not sql.endswith(';'):
             sql += ';'
@@ -240,17 +753,42 @@ class Executor:
         
         tool = self.tools[tool_name]
         
-        if self.verbose:
-            print(f"   🛠️ Executing {tool_name}: {command[:80]}...")
+        log.debug("   🛠️ Executing %s: %.80s...", tool_name, command)
         
         result = tool.execute(command)
         
-        if self.verbose:
-            status = "✅" if result.get("success") else "❌"
-            count = result.get("result_count", "N/A")
-            print(f"   {status} Result: {count} records")
+        log.debug("   %s Result: %s records",
+                  "✅" if result.get("success") else "❌", result.get("result_count", "N/A"))
+        
+        return result
+    
+    async def execute_tool_async(self, tool_name: str, command: str) -> Dict[str, Any]:
+        """Async variant of execute_tool()."""
+        
+        if tool_name not in self.tools:
+            return {"success": False, "error": f"Unknown tool: {tool_name}"}
+        
+        log.debug("   🛠️ Executing %s: %.80s...", tool_name, command)
+        
+        result = await self.tools[tool_name].execute_async(command)
+        
+        log.debug("   %s Result: %s records",
+                  "✅" if result.get("success") else "❌", result.get("result_count", "N/A"))
         
         return result
+    
+    async def execute_structured_async(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a planner {table, where, limit} spec via the compiled executor."""
+        tool = self.tools["crm_database_query"]
+        log.debug("   🛠️ Executing compiled %s executor: %.80s", plan["table"], plan.get("where", ""))
+        
+        result = await asyncio.to_thread(
+            tool.execute_structured, plan["table"], plan.get("where") or "", plan.get("limit", 50)
+        )
+        
+        log.debug("   %s Result: %s records",
+                  "✅" if result.get("success") else "❌", result.get("result_count", "N/A"))
+        return result
 
 
 # ============================================
@@ -277,6 +815,15 @@ class Verifier:
                 "action": "RETRY"
             }
         
+        # Fast path: a single aggregate cell is conclusive, no LLM check needed
+        if self._is_trivially_conclusive(result):
+            return {
+                "verified": True,
+                "reason": "Single-value result is conclusive",
+                "action": "STOP",
+                "fast_path": True
+            }
+        
         # Simple verification for now
         if result.get("result_count", 0) >= 0:
             return {
@@ -290,6 +837,14 @@ class Verifier:
             "reason": "No results returned",
             "action": "STOP"
         }
+    
+    @staticmethod
+    def _is_trivially_conclusive(result: Dict[str, Any]) -> bool:
+        """True for single-cell results and plain COUNT queries."""
+        rows = result.get("results") or []
+        if len(rows) == 1 and len(rows[0]) == 1:
+            return True
+        return bool(_COUNT_RE.match(result.get("query") or ""))
 
 
 # ============================================
@@ -307,7 +862,8 @@ class AgentFlowSolver:
         self,
         max_steps: int = 10,
         max_time: int = 300,
-        verbose: bool = True
+        verbose: bool = True,
+        semantic_cache: bool = False
     ):
         self.max_steps = max_steps
         self.max_time = max_time
@@ -321,22 +877,35 @@ class AgentFlowSolver:
             "crm_database_query": CRMDatabaseTool()
         }
         
+        # NL→SQL cache; the semantic layer costs an embedding call per lookup
+        self.sql_cache = SQLCache(embed_fn=self.llm.get_embedding if semantic_cache else None)
+        
         # Initialize AgentFlow components
-        self.planner = Planner(self.llm, self.tools, verbose)
+        self.planner = Planner(self.llm, self.tools, verbose, sql_cache=self.sql_cache)
         self.executor = Executor(self.tools, verbose)
         self.verifier = Verifier(self.llm, verbose)
-        self.memory = Memory()
+        # Memory is created per query in solve_async(): the solver is shared
+        # by concurrent requests
         
         if verbose:
-            print("🚀 AgentFlow CRM Solver initialized")
-            print(f"   Components: Planner, Executor, Verifier, Memory")
-            print(f"   Tools: {list(self.tools.keys())}")
-            print(f"   Max Steps: {max_steps}")
+            enable_verbose_logging()
+        
+        log.debug("🚀 AgentFlow CRM Solver initialized")
+        log.debug("   Components: Planner, Executor, Verifier, Memory")
+        log.debug("   Tools: %s", list(self.tools.keys()))
+        log.debug("   Max Steps: %s", max_steps)
     
     def solve(self, query: str) -> Dict[str, Any]:
+        """Synchronous entry point for scripts; see solve_async()."""
+        return asyncio.run(self.solve_async(query))
+    
+    async def solve_async(self, query: str) -> Dict[str, Any]:
         """
         Solve a query using the AgentFlow Planner→Executor→Verifier loop.
         
+        LLM and database calls are awaited rather than blocking, so concurrent
+        queries (e.g. from the API event loop) overlap their I/O.
+        
         Args:
             query: Natural language CRM query
             
@@ -344,22 +913,18 @@ class AgentFlowSolver:
             dict with results and execution trace
         """
         start_time = time.time()
-        self.memory.clear()
+        memory = Memory()
         
-        if self.verbose:
-            print(f"\n{'='*60}")
-            print(f"🔍 AgentFlow Processing: {query}")
-            print(f"{'='*60}")
+        log.debug("\n%s\n🔍 AgentFlow Processing: %s\n%s", "=" * 60, query, "=" * 60)
         
         # Step 1: PLANNER - Analyze query
-        if self.verbose:
-            print(f"\n📋 Step 1: Query Analysis (Planner)")
+        log.debug("\n📋 Step 1: Query Analysis (Planner)")
         
-        analysis = self.planner.analyze_query(query)
-        sql = self.planner.generate_sql(query)
+        plan = await self.planner.plan_async(query)
+        sql = plan["sql"]
         
-        if self.verbose:
-            print(f"   Generated SQL: {sql[:100]}...")
+        log.debug("   Intent: %.100s", plan.get("intent", ""))
+        log.debug("   Generated SQL: %.100s...", sql)
         
         # Main execution loop
         step = 0
@@ -369,13 +934,17 @@ class AgentFlowSolver:
             step += 1
             
             # Step 2: EXECUTOR - Run tool
-            if self.verbose:
-                print(f"\n🛠️ Step {step + 1}: Tool Execution (Executor)")
+            log.debug("\n🛠️ Step %d: Tool Execution (Executor)", step + 1)
             
-            result = self.executor.execute_tool("crm_database_query", sql)
+            table = plan.get("table")
+            if step == 1 and isinstance(table, str) and table in self.tools["crm_database_query"].executors:
+                result = await self.executor.execute_structured_async(plan)
+                sql = result.get("query", sql)
+            else:
+                result = await self.executor.execute_tool_async("crm_database_query", sql)
             
             # Record in memory
-            self.memory.add_action(
+            memory.add_action(
                 step=step,
                 tool_name="crm_database_query",
                 sub_goal="Execute SQL query",
@@ -384,15 +953,12 @@ class AgentFlowSolver:
             )
             
             # Step 3: VERIFIER - Check result
-            if self.verbose:
-                print(f"\n✅ Step {step + 2}: Verification (Verifier)")
+            log.debug("\n✅ Step %d: Verification (Verifier)", step + 2)
             
-            verification = self.verifier.verify_result(query, result, self.memory)
+            verification = self.verifier.verify_result(query, result, memory)
             
-            if self.verbose:
-                action = verification.get("action", "UNKNOWN")
-                print(f"   Verification: {verification.get('reason')}")
-                print(f"   Action: {action}")
+            log.debug("   Verification: %s", verification.get("reason"))
+            log.debug("   Action: %s", verification.get("action", "UNKNOWN"))
             
             if verification.get("action") == "STOP":
                 break
@@ -400,20 +966,19 @@ class AgentFlowSolver:
         # Generate final output
         execution_time = round(time.time() - start_time, 2)
         
-        if self.verbose:
-            print(f"\n{'='*60}")
-            print(f"✨ AgentFlow Complete - {step} steps, {execution_time}s")
-            print(f"{'='*60}")
+        log.debug("\n%s\n✨ AgentFlow Complete - %d steps, %ss\n%s", "=" * 60, step, execution_time, "=" * 60)
         
         if result and result.get("success"):
+            # Only SQL that ran successfully is cached
+            await self.planner.cache_sql_async(query, sql)
             return {
                 "success": True,
                 "query": query,
                 "generated_sql": sql,
                 "result_count": result.get("result_count", 0),
                 "results": result.get("results", []),
-                "summary": f"Found {result.get('result_count', 0)} records matching your query.",
-                "memory": self.memory.get_actions(),
+                "summary": f"Found {result.get('result_count', 0)}{'+' if result.get('has_more') else ''} records matching your query.",
+                "memory": memory.get_actions(),
                 "execution_time": execution_time,
                 "steps": step,
                 "agentflow": True,
@@ -426,6 +991,63 @@ class AgentFlowSolver:
                 "query": query,
                 "agentflow": True
             }
+    
+    def solve_batch(self, queries: List[str], batch_size: int = 16) -> List[Dict[str, Any]]:
+        """Synchronous entry point for scripts; see solve_batch_async()."""
+        return asyncio.run(self.solve_batch_async(queries, batch_size))
+    
+    async def solve_batch_async(self, queries: List[str], batch_size: int = 16) -> List[Dict[str, Any]]:
+        """
+        Solve many independent queries, sharing one Planner call per batch.
+        
+        The schema prefix is sent once per batch of up to batch_size queries
+        and all resulting SQL runs in one database round-trip.
+        
+        Returns:
+            list of result dicts in the same order as queries
+        """
+        start_time = time.time()
+        batches = [queries[i:i + batch_size] for i in range(0, len(queries), batch_size)]
+        
+        log.debug("\n🔍 AgentFlow Batch: %d queries in %d planner call(s)", len(queries), len(batches))
+        
+        planned = await asyncio.gather(*(self.planner.plan_batch(b) for b in batches))
+        sqls = [sql for batch in planned for sql in batch]
+        
+        # Plan any queries missing from the batch responses on their own
+        missing = [i for i, sql in enumerate(sqls) if not sql]
+        for i, plan in zip(missing, await asyncio.gather(*(self.planner.plan_async(queries[i]) for i in missing))):
+            sqls[i] = plan["sql"]
+        
+        # All result sets come back in a single database round-trip
+        executed = await asyncio.to_thread(self.tools["crm_database_query"].execute_many, sqls)
+        
+        results = []
+        for query, sql, result in zip(queries, sqls, executed):
+            if result.get("success"):
+                await self.planner.cache_sql_async(query, sql)
+                results.append({
+                    "success": True,
+                    "query": query,
+                    "generated_sql": sql,
+                    "result_count": result.get("result_count", 0),
+                    "results": result.get("results", []),
+                    "summary": f"Found {result.get('result_count', 0)}{'+' if result.get('has_more') else ''} records matching your query.",
+                    "agentflow": True
+                })
+            else:
+                results.append({
+                    "success": False,
+                    "error": result.get("error", "No result"),
+                    "query": query,
+                    "generated_sql": sql,
+                    "agentflow": True
+                })
+        
+        log.debug("✨ AgentFlow Batch Complete - %d/%d succeeded, %.2fs",
+                  sum(1 for r in results if r["success"]), len(results), time.time() - start_time)
+        
+        return results
 
 
 def create_agentflow_solver(
@@ -3,13 +3,91 @@ Email Drafting and Summarization Agent.
 Adapted for existing CRM schema.
 """
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
 import json
+import re
 
+from pydantic import BaseModel, ConfigDict, ValidationError
+from sqlalchemy import text
+
+from app.cache import contact_context_cache
 from app.tools.email_tool import EmailTool
 from app.tools.database_tool import DatabaseTool
-from app.llm_engine import create_azure_engine
-from app.database import execute_query, execute_write
+from app.llm_engine import CachedLLM, get_engine, json_schema_format
+from app.agent_logs import log_agent_execution
+from app.database import aexecute_query, execute_query
+
+
+# Statements parsed once at import and reused on every call
+
+# ROLLUP adds the period total as an extra row (GROUPING(...) = 1)
+_Q_EMAIL_PERFORMANCE = text("""
+    SELECT 
+        DATE(sent_at) as date,
+        COUNT(*) as sent,
+        COUNT(opened_at) as opened,
+        COUNT(clicked_at) as clicked,
+        GROUPING(DATE(sent_at)) = 1 as is_total
+    FROM email_messages
+    WHERE sent_at >= NOW() - make_interval(days => :days)
+    GROUP BY ROLLUP(DATE(sent_at))
+    ORDER BY date DESC
+""")
+
+_Q_OPPORTUNITY = text("""
+    SELECT * FROM opportunities WHERE opportunity_id = :id
+""")
+
+_Q_CONTACT_CONTEXT = text("""
+    SELECT c.*, a.account_name, a.industry
+    FROM contacts c
+    LEFT JOIN accounts a ON c.account_id = a.account_id
+    WHERE c.contact_id = :id
+""")
+
+# Lead verb phrases of strong subject lines, with the swap used for a variant
+SUBJECT_VERB_SYNONYMS = {
+    "following up": "circling back",
+    "circling back": "following up",
+    "checking in": "touching base",
+    "touching base": "checking in",
+    "introducing": "meet",
+    "meet": "introducing",
+    "thank you": "thanks",
+    "thanks": "thank you",
+    "reconnect": "catch up",
+    "catch up": "reconnect",
+    "explore": "discuss",
+    "discuss": "explore",
+    "improve": "boost",
+    "boost": "improve",
+    "grow": "scale",
+    "scale": "grow",
+    "save": "cut",
+    "cut": "save",
+}
+
+_SUBJECT_VERB_RE = re.compile(
+    r"\b(" + "|".join(re.escape(verb) for verb in sorted(SUBJECT_VERB_SYNONYMS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+_SUBJECT_TOPIC_PREFIX_RE = re.compile(r"^(on|about|with|for|re)\b\s*", re.IGNORECASE)
+
+
+class SequenceEmail(BaseModel):
+    """One generated sequence email (structured LLM output)."""
+    model_config = ConfigDict(extra="forbid")
+    
+    subject: str
+    body: str
+
+
+class SequenceEmails(BaseModel):
+    """A whole generated sequence, one email per stage, in order."""
+    model_config = ConfigDict(extra="forbid")
+    
+    emails: List[SequenceEmail]
 
 
 class EmailAgent:
@@ -19,12 +97,26 @@ class EmailAgent:
     """
     
     EMAIL_TYPES = ["initial_outreach", "followup", "re_engagement", "proposal", "thank_you"]
+    SEQUENCE_STAGES = ["intro", "value_prop", "social_proof", "urgency", "break_up"]
+    
+    # Subject alternatives come from template rules when the subject is strong
+    STRONG_SUBJECT_MAX_LENGTH = 60
+    STABLE_TONE_EMAIL_TYPES = ("initial_outreach", "thank_you")
+    
+    # Static system prompts (identical prefix on every call for Azure prompt
+    # caching); per-call details go at the end of the user message
+    SEQUENCE_SYSTEM_PROMPT = """Generate a sales email sequence: one email per listed stage, in order.
+Each email under 150 words, with a subject and body."""
+    SEQUENCE_EMAIL_SYSTEM_PROMPT = """Generate one email of a sales email sequence, for the given stage and position.
+Under 150 words, with a subject and body."""
+    SUBJECT_ALTERNATIVES_SYSTEM_PROMPT = """Generate 3 alternative subject lines for the given email subject.
+Return one subject per line, with no numbering or extra text."""
     
     def __init__(self, verbose: bool = True):
         self.verbose = verbose
         self.email_tool = EmailTool(verbose=verbose)
         self.db_tool = DatabaseTool(verbose=verbose)
-        self.llm = create_azure_engine(temperature=0.7)
+        self.llm = CachedLLM(get_engine(0.7))
         self.agent_type = "email"
     
     def draft_email(
@@ -51,7 +143,8 @@ class EmailAgent:
         if result.get("success"):
             alternatives = self._generate_subject_alternatives(
                 result.get("email", {}).get("subject", ""),
-                email_type
+                email_type,
+                context.get("contact")
             )
             result["subject_alternatives"] = alternatives
             self._log_execution("draft", contact_id, result)
@@ -90,11 +183,37 @@ class EmailAgent:
         if not contact:
             return {"success": False, "error": "Contact not found"}
         
-        stages = ["intro", "value_prop", "social_proof", "urgency", "break_up"][:email_count]
+        stages = self.SEQUENCE_STAGES[:email_count]
+        emails = self._generate_sequence_emails(contact, stages, email_count)
+        return self._sequence_result(contact_id, sequence_type, stages, emails)
+    
+    async def agenerate_sequence(
+        self,
+        contact_id: str,
+        sequence_type: str = "nurture",
+        email_count: int = 5
+    ) -> Dict[str, Any]:
+        """Async generate_sequence() for use inside the app's event loop."""
+        
+        if self.verbose:
+            print(f"📧 EmailAgent: Generating {sequence_type} sequence")
+        
+        contact = await self._aget_contact_context(contact_id)
+        if not contact:
+            return {"success": False, "error": "Contact not found"}
+        
+        stages = self.SEQUENCE_STAGES[:email_count]
+        emails = await self._agenerate_sequence_emails(contact, stages, email_count)
+        return self._sequence_result(contact_id, sequence_type, stages, emails)
+    
+    def _sequence_result(
+        self, contact_id: str, sequence_type: str, stages: List[str], emails: List[Dict]
+    ) -> Dict[str, Any]:
+        """Assemble the sequence response with send delays."""
+        
         sequence = []
         
-        for i, stage in enumerate(stages):
-            email = self._generate_sequence_email(contact, stage, i + 1, email_count)
+        for i, (stage, email) in enumerate(zip(stages, emails)):
             sequence.append({
                 "order": i + 1,
                 "stage": stage,
@@ -113,21 +232,17 @@ class EmailAgent:
     def analyze_email_performance(self, days: int = 30) -> Dict[str, Any]:
         """Analyze email performance metrics."""
         
-        query = f"""
-            SELECT 
-                DATE(sent_at) as date,
-                COUNT(*) as sent,
-                COUNT(opened_at) as opened,
-                COUNT(clicked_at) as clicked
-            FROM email_messages
-            WHERE sent_at >= NOW() - INTERVAL '{days} days'
-            GROUP BY DATE(sent_at)
-            ORDER BY date DESC
-        """
-        daily_stats = execute_query(query, {})
+        rows = execute_query(_Q_EMAIL_PERFORMANCE, {"days": days})
+        
+        total, daily_stats = {}, []
+        for row in rows:
+            if row.pop("is_total"):
+                total = row
+            else:
+                daily_stats.append(row)
         
-        total_sent = sum(d.get("sent", 0) for d in daily_stats)
-        total_opened = sum(d.get("opened", 0) for d in daily_stats)
+        total_sent = total.get("sent", 0)
+        total_opened = total.get("opened", 0)
         
         return {
             "success": True,
@@ -154,10 +269,7 @@ class EmailAgent:
             }
         
         if opportunity_id:
-            opp = execute_query(
-                "SELECT * FROM opportunities WHERE opportunity_id = :id",
-                {"id": opportunity_id}
-            )
+            opp = execute_query(_Q_OPPORTUNITY, {"id": opportunity_id})
             if opp:
                 context["opportunity"] = {
                     "name": opp[0].get("opportunity_name"),
@@ -168,24 +280,84 @@ class EmailAgent:
         return context
     
     def _get_contact_context(self, contact_id: str) -> Optional[Dict]:
-        """Get contact details."""
+        """Get contact details (cached for CONTEXT_CACHE_TTL seconds)."""
         
-        query = """
-            SELECT c.*, a.account_name, a.industry
-            FROM contacts c
-            LEFT JOIN accounts a ON c.account_id = a.account_id
-            WHERE c.contact_id = :id
-        """
-        results = execute_query(query, {"id": contact_id})
-        return results[0] if results else None
+        contact = contact_context_cache.get(contact_id)
+        if contact is None:
+            results = execute_query(_Q_CONTACT_CONTEXT, {"id": contact_id})
+            if not results:
+                return None
+            contact = results[0]
+            contact_context_cache.put(contact_id, contact)
+        
+        return dict(contact)
     
-    def _generate_subject_alternatives(self, original: str, email_type: str) -> List[str]:
-        """Generate alternative subject lines."""
+    async def _aget_contact_context(self, contact_id: str) -> Optional[Dict]:
+        """Async _get_contact_context(); shares its cache."""
         
-        prompt = f"Generate 3 alternative subject lines for a {email_type} email. Original: {original}"
-        response = self.llm.generate(prompt, max_tokens=100)
+        contact = contact_context_cache.get(contact_id)
+        if contact is None:
+            results = await aexecute_query(_Q_CONTACT_CONTEXT, {"id": contact_id})
+            if not results:
+                return None
+            contact = results[0]
+            contact_context_cache.put(contact_id, contact)
+        
+        return dict(contact)
+    
+    def _generate_subject_alternatives(
+        self, original: str, email_type: str, contact: Optional[Dict] = None
+    ) -> List[str]:
+        """Generate alternative subject lines (LLM only for weak subjects)."""
+        
+        variants = self._cheap_subject_variants(original, email_type, contact or {})
+        if variants:
+            return variants
+        
+        prompt = f"Email type: {email_type}\nOriginal: {original}"
+        response = self.llm.generate(
+            prompt, system_prompt=self.SUBJECT_ALTERNATIVES_SYSTEM_PROMPT, max_tokens=100
+        )
         return [l.strip() for l in response.split("\n") if l.strip()][:3]
     
+    def _cheap_subject_variants(self, original: str, email_type: str, contact: Dict) -> Optional[List[str]]:
+        """
+        Three template variants of a strong subject, or None if it is weak.
+        Strong: at most STRONG_SUBJECT_MAX_LENGTH chars, has a known lead verb,
+        and is personalized or for a stable-tone email type.
+        """
+        
+        subject = original.strip()
+        match = _SUBJECT_VERB_RE.search(subject)
+        if not match or len(subject) > self.STRONG_SUBJECT_MAX_LENGTH:
+            return None
+        
+        first_name = (contact.get("name") or "").strip().split(" ")[0]
+        personalized = "{FirstName}" in subject or (
+            first_name and first_name.lower() in subject.lower()
+        )
+        if not personalized and email_type not in self.STABLE_TONE_EMAIL_TYPES:
+            return None
+        
+        verb = match.group(0)
+        synonym = SUBJECT_VERB_SYNONYMS[verb.lower()]
+        if verb[0].isupper():
+            synonym = synonym[0].upper() + synonym[1:]
+        
+        topic = _SUBJECT_TOPIC_PREFIX_RE.sub("", subject[match.end():].strip(" :,-.!?"))
+        company = contact.get("company")
+        
+        variants = [
+            f"Quick question on {topic or subject}",
+            subject[:match.start()] + synonym + subject[match.end():],
+            f"{subject} — {company}" if company else ""
+        ]
+        
+        # Not enough distinct variants: let the LLM write them
+        if not all(variants) or len(set(variants)) < 3:
+            return None
+        return variants
+    
     def _recommend_next_email(self, summary: Dict) -> Dict:
         """Recommend the next email type."""
         
@@ -198,40 +370,120 @@ class EmailAgent:
         else:
             return {"type": "followup", "reason": "Maintain engagement"}
     
+    def _generate_sequence_emails(self, contact: Dict, stages: List[str], total: int) -> List[Dict]:
+        """
+        Generate all sequence emails in one LLM call.
+        Falls back to one call per stage if the batch reply can't be used.
+        """
+        
+        system_prompt, prompt = self._sequence_prompts(contact, stages, total)
+        response = self.llm.generate(
+            prompt,
+            system_prompt=system_prompt,
+            max_tokens=1500,
+            response_format=json_schema_format(SequenceEmails)
+        )
+        
+        emails = self._parse_sequence_emails(response, stages)
+        if emails is not None:
+            return emails
+        
+        return [
+            self._generate_sequence_email(contact, stage, i + 1, total)
+            for i, stage in enumerate(stages)
+        ]
+    
+    async def _agenerate_sequence_emails(
+        self, contact: Dict, stages: List[str], total: int
+    ) -> List[Dict]:
+        """Async _generate_sequence_emails(); the per-stage fallback runs concurrently."""
+        
+        system_prompt, prompt = self._sequence_prompts(contact, stages, total)
+        response = await self.llm.agenerate(
+            prompt,
+            system_prompt=system_prompt,
+            max_tokens=1500,
+            response_format=json_schema_format(SequenceEmails)
+        )
+        
+        emails = self._parse_sequence_emails(response, stages)
+        if emails is not None:
+            return emails
+        
+        async def generate_one(stage: str, order: int) -> Dict:
+            system_prompt, prompt = self._sequence_email_prompts(contact, stage, order, total)
+            response = await self.llm.agenerate(
+                prompt,
+                system_prompt=system_prompt,
+                response_format=json_schema_format(SequenceEmail)
+            )
+            return self._parse_sequence_email(response, stage)
+        
+        return list(await asyncio.gather(*[
+            generate_one(stage, i + 1) for i, stage in enumerate(stages)
+        ]))
+    
+    def _sequence_prompts(self, contact: Dict, stages: List[str], total: int) -> Tuple[str, str]:
+        """(system_prompt, prompt) for a whole sequence."""
+        
+        prompt = f"""
+Emails: {total}
+Stages: {", ".join(stages)}
+Company: {contact.get('account_name')}
+Contact: {contact.get('first_name')} {contact.get('last_name')}
+"""
+        return self.SEQUENCE_SYSTEM_PROMPT, prompt
+    
+    def _parse_sequence_emails(self, response: str, stages: List[str]) -> Optional[List[Dict]]:
+        """Parse a whole-sequence reply; None if it can't be used."""
+        
+        try:
+            emails = SequenceEmails.model_validate_json(response or "").emails
+        except ValidationError:
+            return None  # the call itself failed
+        
+        if len(emails) != len(stages):
+            return None
+        
+        return [email.model_dump() for email in emails]
+    
     def _generate_sequence_email(self, contact: Dict, stage: str, order: int, total: int) -> Dict:
         """Generate a single sequence email."""
         
-        system_prompt = f"""Generate a {stage} email for a sales sequence.
-Email {order} of {total}. Under 150 words. Return as JSON: subject, body"""
-
+        system_prompt, prompt = self._sequence_email_prompts(contact, stage, order, total)
+        response = self.llm.generate(
+            prompt,
+            system_prompt=system_prompt,
+            response_format=json_schema_format(SequenceEmail)
+        )
+        return self._parse_sequence_email(response, stage)
+    
+    def _sequence_email_prompts(self, contact: Dict, stage: str, order: int, total: int) -> Tuple[str, str]:
+        """(system_prompt, prompt) for a single sequence email."""
+        
         prompt = f"""
-Contact: {contact.get('first_name')} {contact.get('last_name')}
+Stage: {stage}
+Email {order} of {total}
 Company: {contact.get('account_name')}
+Contact: {contact.get('first_name')} {contact.get('last_name')}
 """
-
-        response = self.llm.generate(prompt, system_prompt=system_prompt)
-        
+        return self.SEQUENCE_EMAIL_SYSTEM_PROMPT, prompt
+    
+    def _parse_sequence_email(self, response: str, stage: str) -> Dict:
+        """Parse a single-email reply; a failed call's text becomes the body."""
         try:
-            return json.loads(response)
-        except json.JSONDecodeError:
+            return SequenceEmail.model_validate_json(response or "").model_dump()
+        except ValidationError:
             return {"subject": f"{stage.title()} Email", "body": response}
     
     def _log_execution(self, action: str, contact_id: str, result: Dict):
         """Log agent execution."""
         
-        execute_write("""
-            INSERT INTO agent_logs (
-                agent_type, action, input_data, output_data,
-                model_used, related_to_type, related_to_id, success
-            ) VALUES (
-                :agent_type, :action, :input, :output,
-                'gpt-5.2-chat', 'Contact', CAST(:contact_id AS UUID), :success
-            )
-        """, {
-            "agent_type": self.agent_type,
-            "action": action,
-            "input": json.dumps({"contact_id": contact_id}),
-            "output": json.dumps({"email_drafted": True}),
-            "contact_id": contact_id,
-            "success": result.get("success", False)
-        })
+        log_agent_execution(
+            self.agent_type, action,
+            input_data={"contact_id": contact_id},
+            output_data={"email_drafted": True},
+            related_to_type="Contact",
+            related_to_id=contact_id,
+            success=result.get("success", False)
+        )
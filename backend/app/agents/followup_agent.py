@@ -3,14 +3,111 @@ Automated Follow-Up Agent.
 Adapted for existing CRM schema.
 """
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
-import json
+import asyncio
 
+from pydantic import BaseModel, ConfigDict, ValidationError
+from sqlalchemy import text
+
+from app.config import settings
 from app.tools.database_tool import DatabaseTool
 from app.tools.email_tool import EmailTool
-from app.llm_engine import create_azure_engine
-from app.database import execute_query, execute_write
+from app.llm_engine import CachedLLM, get_engine, json_schema_format
+from app.agent_logs import log_agent_execution
+from app.database import aexecute_query, execute_query, execute_write, execute_write_batch
+
+
+# Statements parsed once at import and reused on every call
+_Q_OVERDUE_FOLLOWUPS = text("""
+    SELECT 
+        l.lead_id, l.lead_status, l.ai_score, l.lead_rating,
+        l.first_name, l.last_name, l.email, l.company_name,
+        l.last_contacted_at, l.next_followup_at, l.created_at
+    FROM leads l
+    WHERE l.lead_status IN ('New', 'Contacted', 'Qualified')
+    AND l.is_converted = FALSE
+    AND (
+        l.next_followup_at < NOW()
+        OR (l.next_followup_at IS NULL AND l.last_contacted_at < NOW() - INTERVAL '7 days')
+        OR (l.last_contacted_at IS NULL AND l.created_at < NOW() - INTERVAL '3 days')
+    )
+    ORDER BY l.ai_score DESC NULLS LAST
+    LIMIT 50
+""")
+
+_Q_STALE_OPPORTUNITIES = text("""
+    WITH last_act AS (
+        SELECT related_to_id, MAX(created_at) as last_activity
+        FROM activities
+        WHERE related_to_type = 'Opportunity'
+        GROUP BY related_to_id
+    )
+    SELECT 
+        o.opportunity_id, o.opportunity_name, o.stage, o.amount, o.probability,
+        o.close_date, o.primary_contact_id,
+        a.account_name, a.industry,
+        c.first_name, c.last_name, c.email, c.title,
+        la.last_activity, o.created_at
+    FROM opportunities o
+    LEFT JOIN last_act la ON la.related_to_id = o.opportunity_id
+    LEFT JOIN accounts a ON o.account_id = a.account_id
+    LEFT JOIN contacts c ON o.primary_contact_id = c.contact_id
+    WHERE o.is_closed = FALSE
+    AND o.updated_at < NOW() - INTERVAL '7 days'
+    ORDER BY o.amount DESC NULLS LAST
+    LIMIT 50
+""")
+
+_Q_SCHEDULE_FOLLOWUP = text("""
+    UPDATE leads 
+    SET next_followup_at = :time, updated_at = NOW()
+    WHERE lead_id = :id
+""")
+
+_Q_FOLLOWUP_TASK = text("""
+    INSERT INTO activities (
+        activity_type, subject, description, 
+        related_to_type, related_to_id,
+        due_date, status, ai_generated
+    ) VALUES (
+        'Task', :subject, :description, 
+        'Lead', :lead_id,
+        :due_date, 'Open', TRUE
+    )
+""")
+
+# ROLLUP adds the period total as an extra row (GROUPING(...) = 1)
+_Q_FOLLOWUP_ANALYTICS = text("""
+    SELECT 
+        DATE(due_date) as date,
+        COUNT(*) as total_scheduled,
+        COUNT(CASE WHEN status = 'Completed' THEN 1 END) as completed,
+        COUNT(CASE WHEN ai_generated = TRUE THEN 1 END) as ai_generated,
+        GROUPING(DATE(due_date)) = 1 as is_total
+    FROM activities
+    WHERE activity_type IN ('Email', 'Task', 'Call')
+    AND due_date >= NOW() - make_interval(days => :days)
+    GROUP BY ROLLUP(DATE(due_date))
+    ORDER BY date DESC
+""")
+
+
+def _days_since(timestamp: Optional[datetime]) -> int:
+    """Whole days from timestamp to now (computed here rather than per row in SQL)."""
+    if timestamp is None:
+        return 0
+    return (datetime.now(timestamp.tzinfo) - timestamp).days
+
+
+class FollowupStrategy(BaseModel):
+    """Generated follow-up strategy (structured LLM output)."""
+    model_config = ConfigDict(extra="forbid")
+    
+    talking_points: List[str]
+    value_prop: str
+    cta: str
+    action_plan: str
 
 
 class FollowUpAgent:
@@ -23,11 +120,19 @@ class FollowUpAgent:
         self.verbose = verbose
         self.db_tool = DatabaseTool(verbose=verbose)
         self.email_tool = EmailTool(verbose=verbose)
-        self.llm = create_azure_engine(temperature=0.3)
+        self.llm = CachedLLM(get_engine(0.3))
         self.agent_type = "followup"
     
     def check_and_trigger_followups(self) -> Dict[str, Any]:
-        """Main agent loop: Check for leads/deals needing follow-up."""
+        """Main agent loop (sync wrapper for scripts)."""
+        return asyncio.run(self.acheck_and_trigger_followups())
+    
+    async def acheck_and_trigger_followups(self) -> Dict[str, Any]:
+        """
+        Main agent loop: Check for leads/deals needing follow-up.
+        Leads and opportunities are processed concurrently, at most
+        AGENT_MAX_CONCURRENCY at a time.
+        """
         
         if self.verbose:
             print("📧 FollowUpAgent: Scanning for follow-up opportunities...")
@@ -39,21 +144,35 @@ class FollowUpAgent:
             "emails_drafted": []
         }
         
-        overdue = self._get_overdue_followups()
+        overdue, stale = await asyncio.gather(
+            self._aget_overdue_followups(),
+            self._aget_stale_opportunities()
+        )
         results["overdue_leads"] = overdue
-        
-        stale = self._get_stale_opportunities()
         results["stale_opportunities"] = stale
         
-        for lead in overdue[:10]:
-            action = self._process_overdue_lead(lead)
-            if action:
-                results["scheduled_followups"].append(action)
+        semaphore = asyncio.Semaphore(settings.agent_max_concurrency)
+        lead_actions, opp_actions = await asyncio.gather(
+            asyncio.gather(*[
+                self._arun(semaphore, self._process_overdue_lead, lead) for lead in overdue[:10]
+            ]),
+            asyncio.gather(*[
+                self._arun(semaphore, self._process_stale_opportunity, opp) for opp in stale[:10]
+            ])
+        )
+        lead_actions = [action for action in lead_actions if action]
+        results["scheduled_followups"] = [result for _, _, result in lead_actions]
+        
+        # One transaction, two executemany batches for all scheduled leads
+        if lead_actions:
+            await asyncio.to_thread(execute_write_batch, [
+                (_Q_SCHEDULE_FOLLOWUP, [update for update, _, _ in lead_actions]),
+                (_Q_FOLLOWUP_TASK, [insert for _, insert, _ in lead_actions])
+            ])
+            for update, _, _ in lead_actions:
+                DatabaseTool.invalidate(lead_id=update["id"])
         
-        for opp in stale[:10]:
-            action = self._process_stale_opportunity(opp)
-            if action:
-                results["emails_drafted"].append(action)
+        results["emails_drafted"] = [action for action in opp_actions if action]
         
         self._log_execution(results)
         
@@ -68,56 +187,41 @@ class FollowUpAgent:
             "details": results
         }
     
-    def _get_overdue_followups(self) -> List[Dict]:
+    async def _arun(
+        self, semaphore: asyncio.Semaphore,
+        process: Callable[[Dict], Any], item: Dict
+    ) -> Any:
+        """Run one blocking process step in a worker thread, bounded by semaphore."""
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(process, item)
+            except Exception as e:
+                if self.verbose:
+                    print(f"❌ FollowUpAgent: {process.__name__} failed: {e}")
+                return None
+    
+    async def _aget_overdue_followups(self) -> List[Dict]:
         """Get leads with overdue follow-ups."""
         
-        query = """
-            SELECT 
-                l.lead_id, l.lead_status, l.ai_score, l.lead_rating,
-                l.first_name, l.last_name, l.email, l.company_name,
-                l.last_contacted_at, l.next_followup_at,
-                EXTRACT(DAY FROM (NOW() - COALESCE(l.last_contacted_at, l.created_at))) as days_since_contact
-            FROM leads l
-            WHERE l.lead_status IN ('New', 'Contacted', 'Qualified')
-            AND l.is_converted = FALSE
-            AND (
-                l.next_followup_at < NOW()
-                OR (l.next_followup_at IS NULL AND l.last_contacted_at < NOW() - INTERVAL '7 days')
-                OR (l.last_contacted_at IS NULL AND l.created_at < NOW() - INTERVAL '3 days')
-            )
-            ORDER BY l.ai_score DESC NULLS LAST
-            LIMIT 50
-        """
-        return execute_query(query, {})
+        leads = await aexecute_query(_Q_OVERDUE_FOLLOWUPS, {})
+        for lead in leads:
+            lead["days_since_contact"] = _days_since(lead["last_contacted_at"] or lead["created_at"])
+        return leads
     
-    def _get_stale_opportunities(self) -> List[Dict]:
+    async def _aget_stale_opportunities(self) -> List[Dict]:
         """Get opportunities without recent activity."""
         
-        query = """
-            SELECT 
-                o.opportunity_id, o.opportunity_name, o.stage, o.amount, o.probability,
-                o.close_date,
-                a.account_name,
-                c.first_name, c.last_name, c.email,
-                (SELECT MAX(created_at) FROM activities 
-                 WHERE related_to_type = 'Opportunity' AND related_to_id = o.opportunity_id) as last_activity,
-                EXTRACT(DAY FROM (NOW() - COALESCE(
-                    (SELECT MAX(created_at) FROM activities 
-                     WHERE related_to_type = 'Opportunity' AND related_to_id = o.opportunity_id),
-                    o.created_at
-                ))) as days_stale
-            FROM opportunities o
-            LEFT JOIN accounts a ON o.account_id = a.account_id
-            LEFT JOIN contacts c ON o.primary_contact_id = c.contact_id
-            WHERE o.is_closed = FALSE
-            AND EXTRACT(DAY FROM (NOW() - o.updated_at)) > 7
-            ORDER BY o.amount DESC NULLS LAST
-            LIMIT 50
-        """
-        return execute_query(query, {})
+        opps = await aexecute_query(_Q_STALE_OPPORTUNITIES, {})
+        for opp in opps:
+            opp["days_stale"] = _days_since(opp["last_activity"] or opp["created_at"])
+        return opps
     
-    def _process_overdue_lead(self, lead: Dict) -> Optional[Dict]:
-        """Process an overdue lead and schedule follow-up."""
+    def _process_overdue_lead(self, lead: Dict) -> Optional[Tuple[Dict, Dict, Dict]]:
+        """
+        Plan a follow-up for an overdue lead.
+        Returns (lead update params, activity insert params, result); the
+        caller writes them in one batch.
+        """
         
         days_since = lead.get("days_since_contact") or 0
         
@@ -137,31 +241,15 @@ class FollowUpAgent:
         strategy = self._generate_followup_strategy(lead, followup_type)
         scheduled_time = datetime.now() + timedelta(hours=delay_hours)
         
-        execute_write("""
-            UPDATE leads 
-            SET next_followup_at = :time, updated_at = NOW()
-            WHERE lead_id = :id
-        """, {"time": scheduled_time, "id": lead["lead_id"]})
-        
-        # Log activity
-        execute_write("""
-            INSERT INTO activities (
-                activity_type, subject, description, 
-                related_to_type, related_to_id,
-                due_date, status, ai_generated
-            ) VALUES (
-                'Task', :subject, :description, 
-                'Lead', :lead_id,
-                :due_date, 'Open', TRUE
-            )
-        """, {
+        update = {"time": scheduled_time, "id": lead["lead_id"]}
+        insert = {
             "subject": f"Follow-up: {followup_type.replace('_', ' ').title()}",
             "description": strategy.get("action_plan", ""),
             "lead_id": lead["lead_id"],
             "due_date": scheduled_time
-        })
+        }
         
-        return {
+        return update, insert, {
             "lead_id": str(lead["lead_id"]),
             "contact": f"{lead.get('first_name', '')} {lead.get('last_name', '')}",
             "followup_type": followup_type,
@@ -172,9 +260,17 @@ class FollowUpAgent:
     def _process_stale_opportunity(self, opp: Dict) -> Optional[Dict]:
         """Process a stale opportunity and draft re-engagement email."""
         
+        # Contact fields come from the stale-opportunity JOIN: no re-query
+        contact_id = opp.get("primary_contact_id")
+        contact = {
+            key: opp.get(key)
+            for key in ("first_name", "last_name", "email", "title", "account_name", "industry")
+        } if contact_id else None
+        
         draft_result = self.email_tool.execute({
             "operation": "draft",
-            "contact_id": None,
+            "contact_id": str(contact_id) if contact_id else None,
+            "contact": contact,
             "email_type": "re_engagement",
             "context": f"""
 Opportunity: {opp.get('opportunity_name')}
@@ -216,59 +312,57 @@ Contact: {opp.get('first_name')} {opp.get('last_name')}
         
         system_prompt = """You are a sales engagement strategist. 
 Generate a brief strategy including key talking points, value proposition, and call-to-action.
-Keep response under 150 words. Return as JSON with keys: talking_points, value_prop, cta, action_plan"""
+Keep response under 150 words."""
 
+        # Static system prompt first, lead-specific fields last (prompt caching)
         prompt = f"""
-Lead: {lead.get('first_name')} {lead.get('last_name')}
-Company: {lead.get('company_name')}
-Score: {lead.get('ai_score')}
+Follow-up Type: {followup_type}
 Rating: {lead.get('lead_rating')}
+Score: {lead.get('ai_score')}
 Days since contact: {lead.get('days_since_contact')}
-Follow-up Type: {followup_type}
+Company: {lead.get('company_name')}
+Lead: {lead.get('first_name')} {lead.get('last_name')}
 """
 
-        response = self.llm.generate(prompt, system_prompt=system_prompt)
+        response = self.llm.generate(
+            prompt,
+            system_prompt=system_prompt,
+            response_format=json_schema_format(FollowupStrategy)
+        )
         
         try:
-            return json.loads(response)
-        except json.JSONDecodeError:
+            return FollowupStrategy.model_validate_json(response or "").model_dump()
+        except ValidationError:
+            # Output is schema-constrained, so this is a failed call
             return {"action_plan": response, "value_prop": response, "cta": "Schedule a call"}
     
     def get_followup_analytics(self, days: int = 30) -> Dict[str, Any]:
         """Get follow-up performance analytics."""
         
-        query = f"""
-            SELECT 
-                DATE(due_date) as date,
-                COUNT(*) as total_scheduled,
-                COUNT(CASE WHEN status = 'Completed' THEN 1 END) as completed,
-                COUNT(CASE WHEN ai_generated = TRUE THEN 1 END) as ai_generated
-            FROM activities
-            WHERE activity_type IN ('Email', 'Task', 'Call')
-            AND due_date >= NOW() - INTERVAL '{days} days'
-            GROUP BY DATE(due_date)
-            ORDER BY date DESC
-        """
-        daily_stats = execute_query(query, {})
+        rows = execute_query(_Q_FOLLOWUP_ANALYTICS, {"days": days})
+        
+        total, daily_stats = {}, []
+        for row in rows:
+            if row.pop("is_total"):
+                total = row
+            else:
+                daily_stats.append(row)
         
         return {
             "success": True,
             "period_days": days,
             "daily_stats": daily_stats,
             "summary": {
-                "total_scheduled": sum(d.get("total_scheduled", 0) for d in daily_stats),
-                "completed": sum(d.get("completed", 0) for d in daily_stats),
-                "ai_generated": sum(d.get("ai_generated", 0) for d in daily_stats)
+                "total_scheduled": total.get("total_scheduled", 0),
+                "completed": total.get("completed", 0),
+                "ai_generated": total.get("ai_generated", 0)
             }
         }
     
     def _log_execution(self, results: Dict):
         """Log agent execution."""
         
-        execute_write("""
-            INSERT INTO agent_logs (agent_type, action, output_data, model_used, success)
-            VALUES (:agent_type, 'check_and_trigger', :output, 'gpt-5.2-chat', TRUE)
-        """, {
-            "agent_type": self.agent_type,
-            "output": json.dumps(results.get("summary", {}))
-        })
+        log_agent_execution(
+            self.agent_type, "check_and_trigger",
+            output_data=results.get("summary", {})
+        )
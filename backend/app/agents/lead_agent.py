@@ -4,12 +4,83 @@ Adapted for existing CRM schema.
 """
 
 from typing import Any, Dict, List, Optional
-import json
+import asyncio
 
+from sqlalchemy import text
+
+from app.cache import lead_context_cache
+from app.config import settings
 from app.tools.database_tool import DatabaseTool
 from app.tools.ml_tool import MLTool
-from app.llm_engine import create_azure_engine
-from app.database import execute_query, execute_write
+from app.llm_engine import get_engine
+from app.agent_logs import log_agent_execution
+from app.database import aexecute_query, execute_query, execute_write_returning
+
+
+# Statements parsed once at import and reused on every call
+_Q_UNSCORED_LEADS = text("""
+    SELECT lead_id FROM leads
+    WHERE lead_status = 'New' 
+    AND (ai_score IS NULL OR ai_score = 0)
+    ORDER BY created_at DESC
+    LIMIT :limit
+""")
+
+_Q_ACTIVE_USERS = text("""
+    SELECT user_id FROM users WHERE is_active = TRUE LIMIT 5
+""")
+
+# Round-robin the top qualified unassigned leads over up to 5 active reps and
+# log an activity per assignment, all in one statement
+_Q_AUTO_ROUTE_LEADS = text("""
+    WITH eligible AS (
+        SELECT lead_id, row_number() OVER (ORDER BY ai_score DESC NULLS LAST) as rn
+        FROM leads
+        WHERE (lead_rating = 'Hot' OR ai_score >= 70)
+        AND owner_id IS NULL
+        AND lead_status NOT IN ('Converted', 'Disqualified')
+        ORDER BY ai_score DESC NULLS LAST
+        LIMIT 20
+    ),
+    reps AS (
+        SELECT user_id, row_number() OVER () as rn, COUNT(*) OVER () as n
+        FROM (SELECT user_id FROM users WHERE is_active = TRUE LIMIT 5) u
+    ),
+    assigned AS (
+        UPDATE leads l
+        SET owner_id = r.user_id, lead_status = 'Contacted', updated_at = NOW()
+        FROM eligible e
+        JOIN reps r ON r.rn = (e.rn - 1) % r.n + 1
+        WHERE l.lead_id = e.lead_id
+        RETURNING l.lead_id, l.owner_id, l.ai_score, e.rn
+    ),
+    logged AS (
+        INSERT INTO activities (
+            activity_type, subject, description,
+            related_to_type, related_to_id, status, ai_generated
+        )
+        SELECT 'Task', 'Lead auto-assigned by AI', '', 'Lead', lead_id, 'Open', TRUE
+        FROM assigned
+    )
+    SELECT lead_id, owner_id, ai_score FROM assigned ORDER BY rn
+""")
+
+_Q_LEAD_CONTEXT = text("""
+    SELECT 
+        l.*,
+        u.first_name as owner_first_name,
+        u.last_name as owner_last_name
+    FROM leads l
+    LEFT JOIN users u ON l.owner_id = u.user_id
+    WHERE l.lead_id = :lead_id
+""")
+
+_Q_LEAD_ACTIVITIES = text("""
+    SELECT activity_type, subject, status, created_at
+    FROM activities 
+    WHERE related_to_type = 'Lead' AND related_to_id = :lead_id
+    ORDER BY created_at DESC LIMIT 10
+""")
 
 
 class LeadScoringAgent:
@@ -22,7 +93,7 @@ class LeadScoringAgent:
         self.verbose = verbose
         self.db_tool = DatabaseTool(verbose=verbose)
         self.ml_tool = MLTool(verbose=verbose)
-        self.llm = create_azure_engine(temperature=0.1)
+        self.llm = get_engine(0.1)
         self.agent_type = "lead_scoring"
     
     def analyze_and_score(self, lead_id: str) -> Dict[str, Any]:
@@ -56,29 +127,31 @@ class LeadScoringAgent:
         return output
     
     def batch_score_new_leads(self, limit: int = 50) -> Dict[str, Any]:
-        """Score all unscored new leads."""
-        
-        query = """
-            SELECT lead_id FROM leads
-            WHERE lead_status = 'New' 
-            AND (ai_score IS NULL OR ai_score = 0)
-            ORDER BY created_at DESC
-            LIMIT :limit
+        """Score all unscored new leads (sync wrapper for scripts)."""
+        return asyncio.run(self.abatch_score_new_leads(limit))
+    
+    async def abatch_score_new_leads(self, limit: int = 50, max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Score all unscored new leads concurrently.
+        At most max_workers (default AGENT_MAX_CONCURRENCY) leads are scored at once.
         """
-        leads = execute_query(query, {"limit": limit})
         
-        results = []
+        leads = await aexecute_query(_Q_UNSCORED_LEADS, {"limit": limit})
+        
+        semaphore = asyncio.Semaphore(max_workers or settings.agent_max_concurrency)
+        lead_ids = [str(lead["lead_id"]) for lead in leads]
+        results = await asyncio.gather(
+            *[self._aanalyze_and_score(lead_id, semaphore) for lead_id in lead_ids]
+        )
+        
         qualified = []
         needs_nurturing = []
         
-        for lead in leads:
-            result = self.analyze_and_score(str(lead["lead_id"]))
-            results.append(result)
-            
+        for lead_id, result in zip(lead_ids, results):
             if result.get("qualification") == "qualified":
-                qualified.append(str(lead["lead_id"]))
+                qualified.append(lead_id)
             elif result.get("qualification") == "needs_nurturing":
-                needs_nurturing.append(str(lead["lead_id"]))
+                needs_nurturing.append(lead_id)
         
         return {
             "success": True,
@@ -89,54 +162,35 @@ class LeadScoringAgent:
             "results": results
         }
     
+    async def _aanalyze_and_score(self, lead_id: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """analyze_and_score() in a worker thread, bounded by semaphore."""
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(self.analyze_and_score, lead_id)
+            except Exception as e:
+                if self.verbose:
+                    print(f"❌ LeadScoringAgent: Scoring failed for lead {lead_id}: {e}")
+                return {"success": False, "lead_id": lead_id, "error": str(e)}
+    
     def auto_route_qualified_leads(self) -> Dict[str, Any]:
         """Automatically assign qualified leads to sales reps."""
         
-        query = """
-            SELECT l.lead_id, l.ai_score, l.industry, l.annual_revenue
-            FROM leads l
-            WHERE (l.lead_rating = 'Hot' OR l.ai_score >= 70)
-            AND l.owner_id IS NULL
-            AND l.lead_status NOT IN ('Converted', 'Disqualified')
-            ORDER BY l.ai_score DESC NULLS LAST
-            LIMIT 20
-        """
-        leads = execute_query(query, {})
-        
-        # Get available users (sales reps)
-        users = execute_query("""
-            SELECT user_id FROM users WHERE is_active = TRUE LIMIT 5
-        """, {})
+        assigned = execute_write_returning(_Q_AUTO_ROUTE_LEADS, {})
+        for row in assigned:
+            DatabaseTool.invalidate(lead_id=row["lead_id"])
         
-        if not users:
+        # Nothing routed: distinguish "no reps" from "no qualified leads"
+        if not assigned and not execute_query(_Q_ACTIVE_USERS, {}):
             return {"success": False, "error": "No active users found"}
         
-        user_ids = [u["user_id"] for u in users]
-        assignments = []
-        
-        for i, lead in enumerate(leads):
-            owner_id = user_ids[i % len(user_ids)]
-            
-            execute_write("""
-                UPDATE leads 
-                SET owner_id = :owner, lead_status = 'Contacted', updated_at = NOW() 
-                WHERE lead_id = :id
-            """, {"owner": owner_id, "id": lead["lead_id"]})
-            
-            assignments.append({
-                "lead_id": str(lead["lead_id"]),
-                "assigned_to": str(owner_id),
-                "ai_score": lead["ai_score"]
-            })
-            
-            # Log activity
-            self.db_tool.log_activity(
-                activity_type="Task",
-                subject=f"Lead auto-assigned by AI",
-                related_to_type="Lead",
-                related_to_id=str(lead["lead_id"]),
-                ai_generated=True
-            )
+        assignments = [
+            {
+                "lead_id": str(row["lead_id"]),
+                "assigned_to": str(row["owner_id"]),
+                "ai_score": row["ai_score"]
+            }
+            for row in assigned
+        ]
         
         return {
             "success": True,
@@ -145,18 +199,13 @@ class LeadScoringAgent:
         }
     
     def _gather_lead_context(self, lead_id: str) -> Optional[Dict]:
-        """Gather comprehensive lead context."""
-        
-        query = """
-            SELECT 
-                l.*,
-                u.first_name as owner_first_name,
-                u.last_name as owner_last_name
-            FROM leads l
-            LEFT JOIN users u ON l.owner_id = u.user_id
-            WHERE l.lead_id = :lead_id
-        """
-        results = execute_query(query, {"lead_id": lead_id})
+        """Gather comprehensive lead context (cached for CONTEXT_CACHE_TTL seconds)."""
+        
+        cached = lead_context_cache.get(lead_id)
+        if cached is not None:
+            return dict(cached)
+        
+        results = execute_query(_Q_LEAD_CONTEXT, {"lead_id": lead_id})
         
         if not results:
             return None
@@ -164,16 +213,12 @@ class LeadScoringAgent:
         lead = results[0]
         
         # Get activity history
-        activities = execute_query("""
-            SELECT activity_type, subject, status, created_at
-            FROM activities 
-            WHERE related_to_type = 'Lead' AND related_to_id = :lead_id
-            ORDER BY created_at DESC LIMIT 10
-        """, {"lead_id": lead_id})
+        activities = execute_query(_Q_LEAD_ACTIVITIES, {"lead_id": lead_id})
         
         lead["activities"] = activities
+        lead_context_cache.put(lead_id, lead)
         
-        return lead
+        return dict(lead)
     
     def _generate_recommendations(self, lead_data: Dict, score_result: Dict) -> Dict[str, Any]:
         """Generate actionable recommendations."""
@@ -224,18 +269,11 @@ class LeadScoringAgent:
     def _log_execution(self, lead_id: str, score_result: Dict, output: Dict):
         """Log agent execution."""
         
-        execute_write("""
-            INSERT INTO agent_logs (
-                agent_type, action, input_data, output_data,
-                model_used, related_to_type, related_to_id, success
-            ) VALUES (
-                :agent_type, 'analyze_and_score', :input, :output,
-                'gpt-5.2-chat', 'Lead', CAST(:lead_id AS UUID), :success
-            )
-        """, {
-            "agent_type": self.agent_type,
-            "input": json.dumps({"lead_id": lead_id}),
-            "output": json.dumps({"score": output.get("score"), "qualification": output.get("qualification")}),
-            "lead_id": lead_id,
-            "success": output.get("success", False)
-        })
+        log_agent_execution(
+            self.agent_type, "analyze_and_score",
+            input_data={"lead_id": lead_id},
+            output_data={"score": output.get("score"), "qualification": output.get("qualification")},
+            related_to_type="Lead",
+            related_to_id=lead_id,
+            success=output.get("success", False)
+        )
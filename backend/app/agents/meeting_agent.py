@@ -5,12 +5,84 @@ Adapted for existing CRM schema.
 
 from typing import Any, Dict, List, Optional
 from datetime import datetime, timedelta
-import json
+import asyncio
 
+import orjson
+from sqlalchemy import text
+
+from app.cache import meeting_contact_cache
 from app.tools.calendar_tool import CalendarTool
 from app.tools.database_tool import DatabaseTool
-from app.llm_engine import create_azure_engine
-from app.database import execute_query, execute_write
+from app.llm_engine import get_engine
+from app.database import execute_query, execute_write, execute_write_returning
+
+
+# Statements parsed once at import and reused on every call
+_Q_MEETING = text("""
+    SELECT * FROM meetings WHERE id = :id
+""")
+
+_Q_RESCHEDULE_MEETING = text("""
+    UPDATE meetings 
+    SET start_time = :start, end_time = :end, updated_at = NOW()
+    WHERE id = :id
+""")
+
+# Meeting insert and its agent_logs row in one statement (one roundtrip,
+# one transaction); the log row references the new meeting id
+_Q_SCHEDULE_MEETING = text("""
+    WITH m AS (
+        INSERT INTO meetings (
+            title, meeting_type, start_time, end_time,
+            contact_id, opportunity_id, status, ai_suggested
+        ) VALUES (
+            :title, :type, :start, :end,
+            :contact_id, :opportunity_id, 'scheduled', TRUE
+        )
+        RETURNING id, created_at
+    ), l AS (
+        INSERT INTO agent_logs (
+            agent_type, action, input_data, output_data,
+            model_used, related_to_type, related_to_id, success
+        )
+        SELECT
+            :agent_type, 'schedule_meeting',
+            jsonb_build_object('contact_id', CAST(:contact_id AS TEXT), 'meeting_type', CAST(:type AS TEXT)),
+            jsonb_build_object('meeting_id', m.id),
+            :model_used, 'Contact', CAST(:contact_id AS UUID), TRUE
+        FROM m
+    )
+    SELECT id, created_at FROM m
+""")
+
+# Booked meetings last this long unless rescheduled
+MEETING_DURATION_MINUTES = 30
+
+# One row per contact: only the open opportunity closing soonest is joined
+# (index seek on idx_opportunities_contact_open)
+_Q_CONTACT_CONTEXT = text("""
+    SELECT 
+        c.*,
+        a.account_name, a.industry, a.annual_revenue,
+        o.stage as opp_stage, o.amount as opp_amount
+    FROM contacts c
+    LEFT JOIN accounts a ON c.account_id = a.account_id
+    LEFT JOIN LATERAL (
+        SELECT stage, amount FROM opportunities
+        WHERE primary_contact_id = c.contact_id AND is_closed = FALSE
+        ORDER BY close_date NULLS LAST
+        LIMIT 1
+    ) o ON TRUE
+    WHERE c.contact_id = :contact_id
+""")
+
+# Identical on every call so Azure can serve it from the prompt cache; the
+# per-meeting fields go in the user message
+_PREP_SYSTEM_PROMPT = """Generate brief meeting preparation notes including:
+1. Key talking points (3-4 bullet points)
+2. Questions to ask
+3. Desired outcome
+Return as JSON."""
 
 
 class MeetingAgent:
@@ -23,7 +95,7 @@ class MeetingAgent:
         self.verbose = verbose
         self.calendar_tool = CalendarTool(verbose=verbose)
         self.db_tool = DatabaseTool(verbose=verbose)
-        self.llm = create_azure_engine(temperature=0.3)
+        self.llm = get_engine(0.3)
         self.agent_type = "meeting"
     
     def schedule_meeting(
@@ -33,44 +105,55 @@ class MeetingAgent:
         opportunity_id: str = None,
         preferences: Dict = None
     ) -> Dict[str, Any]:
-        """Intelligently schedule a meeting with a contact."""
+        """Intelligently schedule a meeting with a contact (sync wrapper for scripts)."""
+        return asyncio.run(self.aschedule_meeting(contact_id, meeting_type, opportunity_id, preferences))
+    
+    async def aschedule_meeting(
+        self,
+        contact_id: str,
+        meeting_type: str = "discovery",
+        opportunity_id: str = None,
+        preferences: Dict = None
+    ) -> Dict[str, Any]:
+        """
+        Intelligently schedule a meeting with a contact.
+        Contact lookup runs alongside slot suggestion, and meeting prep
+        alongside meeting creation.
+        """
         
         if self.verbose:
             print(f"📅 MeetingAgent: Scheduling {meeting_type} meeting for contact {contact_id}")
         
-        contact = self._get_contact_context(contact_id)
+        # Contact lookup and optimal time suggestion are independent
+        contact, suggestion = await asyncio.gather(
+            asyncio.to_thread(self._get_contact_context, contact_id),
+            asyncio.to_thread(self.calendar_tool.execute, {
+                "operation": "suggest_time",
+                "contact_id": contact_id,
+                "meeting_type": meeting_type
+            })
+        )
+        
         if not contact:
             return {"success": False, "error": "Contact not found"}
         
-        # Suggest optimal time
-        suggestion = self.calendar_tool.execute({
-            "operation": "suggest_time",
-            "contact_id": contact_id,
-            "meeting_type": meeting_type
-        })
-        
         if not suggestion.get("success"):
             return suggestion
         
         suggested_slot = suggestion.get("suggested_slot", {})
         
-        # Create meeting
-        meeting_result = self.calendar_tool.execute({
-            "operation": "create_meeting",
-            "title": f"{meeting_type.title()} with {contact.get('first_name', '')} {contact.get('last_name', '')}",
-            "contact_id": contact_id,
-            "opportunity_id": opportunity_id,
-            "meeting_type": meeting_type,
-            "start_time": suggested_slot.get("start"),
-            "ai_suggested": True
-        })
+        # Create meeting (and its log row); prep only needs the contact
+        meeting_result, prep = await asyncio.gather(
+            asyncio.to_thread(
+                self._create_meeting, contact, contact_id, opportunity_id,
+                meeting_type, suggested_slot.get("start")
+            ),
+            asyncio.to_thread(self._generate_meeting_prep, contact, meeting_type)
+        )
         
         if not meeting_result.get("success"):
             return meeting_result
         
-        prep = self._generate_meeting_prep(contact, meeting_type)
-        self._log_execution(contact_id, meeting_type, meeting_result)
-        
         return {
             "success": True,
             "meeting": meeting_result.get("meeting"),
@@ -93,24 +176,20 @@ class MeetingAgent:
         
         meetings = result.get("meetings", [])
         
-        enriched = []
+        # Rows are fresh dicts from the query, so annotate them in place
         for meeting in meetings:
-            prep = self._generate_quick_prep(meeting)
-            enriched.append({**meeting, "quick_prep": prep})
+            meeting["quick_prep"] = self._generate_quick_prep(meeting)
         
         return {
             "success": True,
-            "count": len(enriched),
-            "meetings": enriched
+            "count": len(meetings),
+            "meetings": meetings
         }
     
     def reschedule_with_suggestion(self, meeting_id: str, reason: str = "") -> Dict[str, Any]:
         """Reschedule a meeting with AI-suggested new time."""
         
-        meeting = execute_query(
-            "SELECT * FROM meetings WHERE id = :id",
-            {"id": meeting_id}
-        )
+        meeting = execute_query(_Q_MEETING, {"id": meeting_id})
         
         if not meeting:
             return {"success": False, "error": "Meeting not found"}
@@ -128,11 +207,7 @@ class MeetingAgent:
         
         new_slot = slots_result["slots"][0]
         
-        execute_write("""
-            UPDATE meetings 
-            SET start_time = :start, end_time = :end, updated_at = NOW()
-            WHERE id = :id
-        """, {
+        execute_write(_Q_RESCHEDULE_MEETING, {
             "start": new_slot["start"],
             "end": new_slot["end"],
             "id": meeting_id
@@ -146,30 +221,21 @@ class MeetingAgent:
         }
     
     def _get_contact_context(self, contact_id: str) -> Optional[Dict]:
-        """Get contact with account info."""
-        
-        query = """
-            SELECT 
-                c.*,
-                a.account_name, a.industry, a.annual_revenue,
-                o.stage as opp_stage, o.amount as opp_amount
-            FROM contacts c
-            LEFT JOIN accounts a ON c.account_id = a.account_id
-            LEFT JOIN opportunities o ON o.primary_contact_id = c.contact_id AND o.is_closed = FALSE
-            WHERE c.contact_id = :contact_id
-        """
-        results = execute_query(query, {"contact_id": contact_id})
-        return results[0] if results else None
+        """Get contact with account info (cached for CONTEXT_CACHE_TTL seconds)."""
+        
+        contact = meeting_contact_cache.get(contact_id)
+        if contact is None:
+            results = execute_query(_Q_CONTACT_CONTEXT, {"contact_id": contact_id})
+            if not results:
+                return None
+            contact = results[0]
+            meeting_contact_cache.put(contact_id, contact)
+        
+        return dict(contact)
     
     def _generate_meeting_prep(self, contact: Dict, meeting_type: str) -> Dict:
         """Generate AI meeting prep."""
         
-        system_prompt = """Generate brief meeting preparation notes including:
-1. Key talking points (3-4 bullet points)
-2. Questions to ask
-3. Desired outcome
-Return as JSON."""
-
         prompt = f"""
 Meeting Type: {meeting_type}
 Contact: {contact.get('first_name')} {contact.get('last_name')}
@@ -179,11 +245,15 @@ Opportunity Stage: {contact.get('opp_stage', 'N/A')}
 Opportunity Value: ${contact.get('opp_amount', 0):,.0f}
 """
 
-        response = self.llm.generate(prompt, system_prompt=system_prompt)
+        response = self.llm.generate(
+            prompt, system_prompt=_PREP_SYSTEM_PROMPT,
+            response_format={"type": "json_object"}
+        )
         
+        # JSON mode guarantees an object; only an LLM error reply lands here
         try:
-            return json.loads(response)
-        except json.JSONDecodeError:
+            return orjson.loads(response)
+        except orjson.JSONDecodeError:
             return {"notes": response}
     
     def _generate_quick_prep(self, meeting: Dict) -> str:
@@ -192,21 +262,44 @@ Opportunity Value: ${contact.get('opp_amount', 0):,.0f}
         meeting_type = meeting.get("meeting_type", "meeting")
         return f"{company} - {meeting_type.title()} call"
     
-    def _log_execution(self, contact_id: str, meeting_type: str, result: Dict):
-        """Log agent execution."""
-        
-        execute_write("""
-            INSERT INTO agent_logs (
-                agent_type, action, input_data, output_data,
-                model_used, related_to_type, related_to_id, success
-            ) VALUES (
-                :agent_type, 'schedule_meeting', :input, :output,
-                'gpt-5.2-chat', 'Contact', CAST(:contact_id AS UUID), :success
-            )
-        """, {
-            "agent_type": self.agent_type,
-            "input": json.dumps({"contact_id": contact_id, "meeting_type": meeting_type}),
-            "output": json.dumps({"meeting_id": result.get("meeting", {}).get("id")}),
-            "contact_id": contact_id,
-            "success": result.get("success", False)
-        })
+    def _create_meeting(
+        self,
+        contact: Dict,
+        contact_id: str,
+        opportunity_id: Optional[str],
+        meeting_type: str,
+        start_time: Optional[str]
+    ) -> Dict[str, Any]:
+        """Insert the meeting and its agent_logs row in one roundtrip."""
+        
+        if not start_time:
+            return {"success": False, "error": "start_time is required"}
+        
+        start = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
+        end = start + timedelta(minutes=MEETING_DURATION_MINUTES)
+        title = f"{meeting_type.title()} with {contact.get('first_name', '')} {contact.get('last_name', '')}"
+        
+        try:
+            rows = execute_write_returning(_Q_SCHEDULE_MEETING, {
+                "title": title,
+                "type": meeting_type,
+                "start": start,
+                "end": end,
+                "contact_id": contact_id,
+                "opportunity_id": opportunity_id,
+                "agent_type": self.agent_type,
+                "model_used": self.llm.deployment_name
+            })
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        
+        return {
+            "success": True,
+            "meeting": {
+                "id": str(rows[0]["id"]) if rows else None,
+                "title": title,
+                "start_time": start.isoformat(),
+                "end_time": end.isoformat(),
+                "created_at": rows[0]["created_at"].isoformat() if rows else None
+            }
+        }
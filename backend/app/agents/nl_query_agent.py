@@ -4,12 +4,107 @@ Translates natural language questions into database queries.
 Adapted for existing CRM schema.
 """
 
-from typing import Any, Dict, List, Optional
-import json
+from typing import Any, Dict, List, Optional, Tuple
+from decimal import Decimal
+import hashlib
+import math
 import re
+import threading
 
-from app.llm_engine import create_gpt5_engine
-from app.database import execute_query, execute_write
+import orjson
+
+from app.config import settings
+from app.llm_engine import ResponseCache, create_gpt5_engine, get_engine, normalize_prompt
+from app.agent_logs import log_nl_query
+from app.database import execute_query, execute_query_capped, limit_rows
+
+
+# Statements a generated query must never contain, matched as whole words
+# in one scan of the SQL
+DANGEROUS_KEYWORDS = (
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE', 'TRUNCATE',
+    'EXEC', 'EXECUTE', 'GRANT', 'REVOKE', 'COPY'
+)
+_DANGEROUS_RE = re.compile(r'\b(' + '|'.join(DANGEROUS_KEYWORDS) + r')\b', re.IGNORECASE)
+
+# Markdown code fences around generated SQL
+_SQL_FENCE_RE = re.compile(r'```(?:sql)?\s*')
+
+# Generated SQL without a trailing LIMIT is wrapped to return at most this
+# many rows (limit_rows), and rows are fetched through a server-side cursor
+NL_QUERY_MAX_ROWS = 500
+
+# Canned SQL for the stock questions (pattern table and LLM-failure fallback)
+SQL_HOT_LEADS = "SELECT * FROM leads WHERE lead_rating = 'Hot' ORDER BY created_at DESC LIMIT 50;"
+SQL_QUALIFIED_LEADS = "SELECT * FROM leads WHERE lead_status = 'Qualified' ORDER BY created_at DESC LIMIT 50;"
+SQL_LEADS = "SELECT * FROM leads ORDER BY created_at DESC LIMIT 50;"
+SQL_TOP_OPPORTUNITIES = "SELECT * FROM opportunities WHERE is_closed = FALSE ORDER BY amount DESC NULLS LAST LIMIT 10;"
+SQL_OPEN_OPPORTUNITIES = "SELECT * FROM opportunities WHERE is_closed = FALSE ORDER BY amount DESC NULLS LAST LIMIT 50;"
+SQL_CONTACTS = """SELECT c.*, a.account_name FROM contacts c 
+                  LEFT JOIN accounts a ON c.account_id = a.account_id 
+                  ORDER BY c.created_at DESC LIMIT 50;"""
+SQL_ACCOUNTS = "SELECT * FROM accounts ORDER BY annual_revenue DESC NULLS LAST LIMIT 50;"
+SQL_PIPELINE_BY_STAGE = """SELECT stage, COUNT(*) as count, SUM(amount) as total_value 
+                           FROM opportunities WHERE is_closed = FALSE 
+                           GROUP BY stage ORDER BY count DESC;"""
+SQL_ACTIVITIES = "SELECT * FROM activities ORDER BY created_at DESC LIMIT 50;"
+
+# Whole questions (normalized, trailing punctuation dropped) answered
+# without the LLM; anything with extra filters goes to the LLM
+_LIST = r'(?:show|list|get|find)(?: me)?(?: all)?(?: the)? '
+_PATTERN_SQL = [
+    (re.compile(_LIST + r'hot leads'), SQL_HOT_LEADS),
+    (re.compile(_LIST + r'qualified leads'), SQL_QUALIFIED_LEADS),
+    (re.compile(_LIST + r'leads'), SQL_LEADS),
+    (re.compile(r'(?:what are |show me |list )?(?:the )?top 10 (?:opportunities|deals)(?: by amount)?'), SQL_TOP_OPPORTUNITIES),
+    (re.compile(_LIST + r'(?:open )?(?:opportunities|deals)'), SQL_OPEN_OPPORTUNITIES),
+    (re.compile(_LIST + r'contacts'), SQL_CONTACTS),
+    (re.compile(_LIST + r'accounts'), SQL_ACCOUNTS),
+    (re.compile(r"(?:what's |what is |show |show me )?(?:the )?(?:total )?pipeline(?: value)? by stage"), SQL_PIPELINE_BY_STAGE),
+    (re.compile(_LIST + r'activities'), SQL_ACTIVITIES),
+]
+
+# Answered questions ({generated_sql, result_count, results, summary}), reused
+# for repeat (or, with LLM_SEMANTIC_CACHE, near-identical) questions
+_query_cache = ResponseCache(
+    max_entries=settings.nl_query_cache_size,
+    similarity_threshold=settings.nl_query_cache_threshold,
+    ttl=settings.nl_query_cache_ttl
+)
+
+# Unit-length mean embedding of the example questions ("simple query"
+# centroid), computed on first routed question
+_simple_centroid: Optional[List[float]] = None
+_centroid_lock = threading.Lock()
+
+
+def _unit(vector: List[float]) -> List[float]:
+    """Vector scaled to length 1 (unchanged if zero)."""
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else vector
+
+
+# Summary prompt payload: text values longer than this are cut
+SUMMARY_MAX_TEXT_LENGTH = 200
+
+
+def _json_default(value: Any) -> Any:
+    """Fallback for values orjson cannot encode natively (e.g. Decimal)."""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _compact_rows(rows: List[Dict]) -> str:
+    """Rows as compact JSON for a prompt: no NULL columns, long text truncated."""
+    compact = [
+        {
+            key: value[:SUMMARY_MAX_TEXT_LENGTH] if isinstance(value, str) else value
+            for key, value in row.items() if value is not None
+        }
+        for row in rows
+    ]
+    return orjson.dumps(compact, default=_json_default).decode()
 
 
 class NLQueryAgent:
@@ -52,12 +147,41 @@ Key Relationships:
 - opportunities.primary_contact_id -> contacts.contact_id
 - activities uses polymorphic relation via related_to_type and related_to_id
 """
+    
+    # Static system prompts: built once and sent byte-identical on every call,
+    # so Azure serves the schema prefix from its prompt cache; the user's
+    # question goes last, in the user message
+    SQL_SYSTEM_PROMPT = """You are an expert SQL query generator for a CRM database.
+Convert the user's natural language question into a PostgreSQL SELECT query.
+""" + SCHEMA_CONTEXT + """
+Rules:
+1. ONLY generate SELECT queries - no INSERT, UPDATE, DELETE, DROP, etc.
+2. Always use table aliases for clarity
+3. Include appropriate JOINs when data spans multiple tables
+4. Add reasonable LIMIT (default 50) unless user asks for all
+5. Use ILIKE for text searches to be case-insensitive
+6. For date ranges, use appropriate PostgreSQL date functions
+7. Return ONLY the SQL query, no explanations
+8. If the query is ambiguous or cannot be answered, return: UNABLE: <reason>
+"""
+    
+    SUMMARY_SYSTEM_PROMPT = """Summarize these CRM query results in 1-2 sentences. 
+Be specific about key numbers and insights."""
 
     def __init__(self, verbose: bool = True):
         self.verbose = verbose
         # Use temperature=1.0 for O1/GPT-5 class models as they require it
         self.llm = create_gpt5_engine(temperature=1.0)
+        # Small SQL model for questions close to the stock examples
+        self.sql_llm = (
+            get_engine(0.0, settings.azure_openai_sql_deployment_name)
+            if settings.azure_openai_sql_deployment_name else None
+        )
         self.agent_type = "nl_query"
+        # Cached answers are tied to the deployment and schema version, so a
+        # schema (prompt) change stops serving old answers
+        schema_version = hashlib.blake2b(self.SQL_SYSTEM_PROMPT.encode(), digest_size=8).hexdigest()
+        self._cache_scope = f"{self.llm.deployment_name}\0{schema_version}"
     
     def query(self, natural_language_query: str, user_id: str = None) -> Dict[str, Any]:
         """
@@ -67,13 +191,25 @@ Key Relationships:
         if self.verbose:
             print(f"🔍 NLQueryAgent: Processing query: {natural_language_query}")
         
+        # Step 0: Serve repeat questions without SQL generation, query or summary
+        cached, vector = self._get_cached_answer(natural_language_query)
+        if cached is not None:
+            if self.verbose:
+                print("⚡ NLQueryAgent: Query cache hit")
+            self._log_query(
+                natural_language_query, cached["generated_sql"], cached["result_count"],
+                True, None, user_id
+            )
+            return {"success": True, "query": natural_language_query, **cached, "cached": True}
+        
         # Step 1: Generate SQL from natural language
-        sql_result = self._generate_sql(natural_language_query)
+        sql_result = self._generate_sql(natural_language_query, vector)
         
         if not sql_result.get("success"):
             return sql_result
         
         sql = sql_result.get("sql")
+        usage = sql_result.get("usage")
         
         # Step 2: Validate and sanitize SQL
         validation = self._validate_sql(sql)
@@ -85,12 +221,12 @@ Key Relationships:
                 "details": validation.get("issues", [])
             }
         
-        # Step 3: Execute the query
+        # Step 3: Execute the query (row count bounded)
         try:
-            results = execute_query(sql, {})
+            results = execute_query_capped(limit_rows(sql, NL_QUERY_MAX_ROWS), {}, cap=NL_QUERY_MAX_ROWS)
             result_count = len(results)
         except Exception as e:
-            self._log_query(natural_language_query, sql, None, False, str(e), user_id)
+            self._log_query(natural_language_query, sql, None, False, str(e), user_id, usage)
             return {
                 "success": False,
                 "error": f"Query execution failed: {str(e)}",
@@ -101,46 +237,106 @@ Key Relationships:
         summary = self._generate_summary(natural_language_query, results)
         
         # Log successful query
-        self._log_query(natural_language_query, sql, result_count, True, None, user_id)
+        self._log_query(natural_language_query, sql, result_count, True, None, user_id, usage)
         
-        return {
-            "success": True,
-            "query": natural_language_query,
+        answer = {
             "generated_sql": sql,
             "result_count": result_count,
             "results": results[:100],
             "summary": summary
         }
+        _query_cache.put(self._cache_scope, 0, natural_language_query, answer, vector)
+        
+        return {"success": True, "query": natural_language_query, **answer}
     
-    def _generate_sql(self, query: str) -> Dict[str, Any]:
-        """Generate SQL from natural language using GPT-5 Pro with fallback."""
+    def _get_cached_answer(self, query: str) -> Tuple[Optional[Dict], Optional[List[float]]]:
+        """
+        (cached answer or None, query embedding or None). The embedding is
+        only computed for the semantic tier and is reused when storing.
+        """
+        cached = _query_cache.get(self._cache_scope, 0, query)
+        if cached is not None or not settings.llm_semantic_cache:
+            return cached, None
         
-        # First try LLM-based generation
-        system_prompt = f"""You are an expert SQL query generator for a CRM database.
-Convert the user's natural language question into a PostgreSQL SELECT query.
-
-{self.SCHEMA_CONTEXT}
-
-Rules:
-1. ONLY generate SELECT queries - no INSERT, UPDATE, DELETE, DROP, etc.
-2. Always use table aliases for clarity
-3. Include appropriate JOINs when data spans multiple tables
-4. Add reasonable LIMIT (default 50) unless user asks for all
-5. Use ILIKE for text searches to be case-insensitive
-6. For date ranges, use appropriate PostgreSQL date functions
-7. Return ONLY the SQL query, no explanations
-8. If the query is ambiguous or cannot be answered, return: UNABLE: <reason>
-"""
-
+        try:
+            vector = self.llm.get_embedding(normalize_prompt(query))
+        except Exception as e:
+            print(f"⚠️ Embedding Error: {str(e)}")
+            return None, None
+        return _query_cache.get(self._cache_scope, 0, query, vector), vector
+    
+    def _classify_complexity(self, query: str, vector: Optional[List[float]] = None) -> float:
+        """
+        Cosine similarity of the question to the example-question centroid
+        (higher = simpler). 0.0 when embeddings are unavailable.
+        """
+        global _simple_centroid
+        
+        try:
+            if _simple_centroid is None:
+                with _centroid_lock:
+                    if _simple_centroid is None:
+                        vectors = [
+                            self.llm.get_embedding(normalize_prompt(example))
+                            for example in self.get_example_queries()
+                        ]
+                        _simple_centroid = _unit([sum(column) / len(vectors) for column in zip(*vectors)])
+            if vector is None:
+                vector = self.llm.get_embedding(normalize_prompt(query))
+        except Exception as e:
+            print(f"⚠️ Embedding Error: {str(e)}")
+            return 0.0
+        
+        return sum(x * y for x, y in zip(_unit(vector), _simple_centroid))
+    
+    def _route_sql_llm(self, query: str, vector: Optional[List[float]] = None):
+        """Small SQL engine for simple questions, otherwise the GPT-5 engine."""
+        
+        if self.sql_llm is None:
+            return self.llm
+        
+        score = self._classify_complexity(query, vector)
+        if self.verbose:
+            print(f"🧭 Complexity score: {score:.2f}")
+        return self.sql_llm if score >= settings.nl_query_simple_threshold else self.llm
+    
+    def _generate_sql(self, query: str, vector: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        Generate SQL from natural language: stock questions from the pattern
+        table, simple ones on the small SQL model, the rest on GPT-5, with
+        pattern fallback.
+        """
+        
+        # Stock questions map to fixed SQL; skip the LLM for them
+        pattern_sql = self._pattern_sql(query)
+        if pattern_sql:
+            if self.verbose:
+                print(f"✅ Pattern SQL: {pattern_sql}")
+            return {"success": True, "sql": pattern_sql, "source": "pattern"}
+        
+        # Otherwise LLM-based generation
         prompt = f"Convert to SQL: {query}"
         
-        response = self.llm.generate(prompt, system_prompt=system_prompt)
+        llm = self._route_sql_llm(query, vector)
+        response = llm.generate(prompt, system_prompt=self.SQL_SYSTEM_PROMPT)
+        usage = llm.last_usage
+        
+        # Small model couldn't answer: escalate to GPT-5
+        if llm is not self.llm and self._is_unusable(response):
+            if self.verbose:
+                print("↗️ SQL model declined, escalating to GPT-5")
+            llm = self.llm
+            response = llm.generate(prompt, system_prompt=self.SQL_SYSTEM_PROMPT)
+            usage = llm.last_usage
         
         if self.verbose:
+            print(f"🧠 SQL model: {llm.deployment_name}")
             print(f"🤖 LLM Response: {response[:200]}...")
+            if usage:
+                print(f"   Prompt tokens: {usage['prompt_tokens']} ({usage['cached_tokens']} cached)")
         
         # Check if LLM failed or returned error
-        if response is None or "[LLM Unavailable" in response or "Error" in response or response.strip().startswith("UNABLE:"):
+        if self._is_unusable(response):
             if self.verbose:
                 print(f"⚠️ LLM failed, trying fallback for: {query}")
             # Try fallback pattern matching
@@ -159,7 +355,23 @@ Rules:
         if self.verbose:
             print(f"✅ Generated SQL: {sql}")
         
-        return {"success": True, "sql": sql}
+        return {"success": True, "sql": sql, "usage": usage, "model": llm.deployment_name}
+    
+    def _is_unusable(self, response: Optional[str]) -> bool:
+        """True if the LLM failed or declined instead of returning SQL."""
+        return (
+            response is None or "[LLM Unavailable" in response or "Error" in response
+            or response.strip().startswith("UNABLE:")
+        )
+    
+    def _pattern_sql(self, query: str) -> Optional[str]:
+        """SQL for a stock question matched as a whole, or None."""
+        
+        question = normalize_prompt(query).rstrip("?.! ")
+        for pattern, sql in _PATTERN_SQL:
+            if pattern.fullmatch(question):
+                return sql
+        return None
     
     def _fallback_sql_generation(self, query: str) -> Optional[str]:
         """Generate SQL using pattern matching when LLM is unavailable."""
@@ -169,44 +381,38 @@ Rules:
         # Pattern: "show me all leads" or "list leads"
         if 'lead' in query_lower and ('show' in query_lower or 'list' in query_lower or 'all' in query_lower):
             if 'hot' in query_lower:
-                return "SELECT * FROM leads WHERE lead_rating = 'Hot' ORDER BY created_at DESC LIMIT 50;"
+                return SQL_HOT_LEADS
             if 'qualified' in query_lower:
-                return "SELECT * FROM leads WHERE lead_status = 'Qualified' ORDER BY created_at DESC LIMIT 50;"
-            return "SELECT * FROM leads ORDER BY created_at DESC LIMIT 50;"
+                return SQL_QUALIFIED_LEADS
+            return SQL_LEADS
         
         # Pattern: "show opportunities" or "deals"
         if 'opportunit' in query_lower or 'deal' in query_lower:
             if 'top' in query_lower:
-                return "SELECT * FROM opportunities WHERE is_closed = FALSE ORDER BY amount DESC NULLS LAST LIMIT 10;"
-            return "SELECT * FROM opportunities WHERE is_closed = FALSE ORDER BY amount DESC NULLS LAST LIMIT 50;"
+                return SQL_TOP_OPPORTUNITIES
+            return SQL_OPEN_OPPORTUNITIES
         
         # Pattern: "show contacts"
         if 'contact' in query_lower:
-            return """SELECT c.*, a.account_name FROM contacts c 
-                      LEFT JOIN accounts a ON c.account_id = a.account_id 
-                      ORDER BY c.created_at DESC LIMIT 50;"""
+            return SQL_CONTACTS
         
         # Pattern: "show accounts"
         if 'account' in query_lower or 'compan' in query_lower:
-            return "SELECT * FROM accounts ORDER BY annual_revenue DESC NULLS LAST LIMIT 50;"
+            return SQL_ACCOUNTS
         
         # Pattern: "pipeline" or "stage"
         if 'pipeline' in query_lower or 'stage' in query_lower:
-            return """SELECT stage, COUNT(*) as count, SUM(amount) as total_value 
-                      FROM opportunities WHERE is_closed = FALSE 
-                      GROUP BY stage ORDER BY count DESC;"""
+            return SQL_PIPELINE_BY_STAGE
         
         # Pattern: "activities"
         if 'activit' in query_lower:
-            return "SELECT * FROM activities ORDER BY created_at DESC LIMIT 50;"
+            return SQL_ACTIVITIES
         
         return None
     
     def _clean_sql(self, sql: str) -> str:
         """Clean and normalize the generated SQL."""
-        sql = re.sub(r'```sql\s*', '', sql)
-        sql = re.sub(r'```\s*', '', sql)
-        sql = sql.strip()
+        sql = _SQL_FENCE_RE.sub('', sql).strip()
         if not sql.endswith(';'):
             sql += ';'
         return sql
@@ -218,24 +424,18 @@ Rules:
         
         # Clean and normalize
         sql_clean = sql.strip()
-        sql_upper = sql_clean.upper()
         issues = []
         
         if self.verbose:
             print(f"🔍 Validating SQL: {sql_clean[:100]}...")
         
-        dangerous = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE', 
-                    'TRUNCATE', 'EXEC', 'EXECUTE', 'GRANT', 'REVOKE']
-        
-        for keyword in dangerous:
-            # Check for dangerous keywords with word boundaries
-            if f" {keyword} " in f" {sql_upper} " or sql_upper.startswith(keyword):
-                issues.append(f"Dangerous keyword found: {keyword}")
+        # Check for dangerous keywords with word boundaries (each reported once)
+        for keyword in dict.fromkeys(match.upper() for match in _DANGEROUS_RE.findall(sql_clean)):
+            issues.append(f"Dangerous keyword found: {keyword}")
         
-        # Check if it starts with SELECT (after removing common prefixes)
-        sql_check = sql_upper.lstrip()
-        if not sql_check.startswith('SELECT'):
-            issues.append(f"Query must start with SELECT, got: {sql_check[:30]}...")
+        # Check if it starts with SELECT
+        if sql_clean[:6].upper() != 'SELECT':
+            issues.append(f"Query must start with SELECT, got: {sql_clean[:30].upper()}...")
         
         if self.verbose and issues:
             print(f"⚠️ Validation issues: {issues}")
@@ -251,29 +451,17 @@ Rules:
         count = len(results)
         
         if count <= 10:
-            system_prompt = """Summarize these CRM query results in 1-2 sentences. 
-Be specific about key numbers and insights."""
-
-            prompt = f"Question: {query}\nResults ({count} records):\n{json.dumps(results[:10], indent=2, default=str)}"
-            return self.llm.generate(prompt, system_prompt=system_prompt, max_tokens=150)
+            prompt = f"Question: {query}\nResults ({count} records):\n{_compact_rows(results[:10])}"
+            return self.llm.generate(prompt, system_prompt=self.SUMMARY_SYSTEM_PROMPT, max_tokens=150)
         
         return f"Found {count} records matching your query. Showing first 100 results."
     
     def _log_query(self, query_text: str, sql: str, result_count: Optional[int],
-                   success: bool, error: Optional[str], user_id: Optional[str]):
-        """Log the query for analytics."""
-        
-        execute_write("""
-            INSERT INTO nl_queries (query_text, generated_sql, result_count, user_id, success, error_message)
-            VALUES (:query, :sql, :count, CAST(:user AS UUID), :success, :error)
-        """, {
-            "query": query_text,
-            "sql": sql,
-            "count": result_count,
-            "user": user_id,
-            "success": success,
-            "error": error
-        })
+                   success: bool, error: Optional[str], user_id: Optional[str],
+                   usage: Optional[Dict[str, int]] = None):
+        """Log the query for analytics (with SQL-generation token usage)."""
+        
+        log_nl_query(query_text, sql, result_count, success, error, user_id, usage)
     
     def get_example_queries(self) -> List[str]:
         """Return example queries users can try."""
@@ -5,11 +5,11 @@ Adapted for existing CRM schema.
 
 from typing import Any, Dict, List
 from datetime import datetime
-import json
 
 from app.tools.ml_tool import MLTool
 from app.llm_engine import create_gpt5_engine
-from app.database import execute_query, execute_write
+from app.agent_logs import log_agent_execution
+from app.database import execute_query
 
 
 class PipelineAgent:
@@ -354,12 +354,9 @@ Recommend ONE specific action to save this deal (1-2 sentences).
     def _log_execution(self, action: str, input_data: Dict, output_data: Dict):
         """Log agent execution."""
         
-        execute_write("""
-            INSERT INTO agent_logs (agent_type, action, input_data, output_data, model_used, success)
-            VALUES (:agent_type, :action, :input, :output, 'gpt-5-pro', true)
-        """, {
-            "agent_type": self.agent_type,
-            "action": action,
-            "input": json.dumps(input_data),
-            "output": json.dumps({"summary": "forecast_generated"})
-        })
+        log_agent_execution(
+            self.agent_type, action,
+            input_data=input_data,
+            output_data={"summary": "forecast_generated"},
+            model_used="gpt-5-pro"
+        )
@@ -0,0 +1,205 @@
+"""
+Caches for the Agentic CRM backend.
+
+Persistent LLM response cache: SQLite-backed (WAL mode), keyed by a blake2b
+hash of the prompt inputs. Entries older than max_age seconds are not
+served, and every PRUNE_EVERY writes expired entries are deleted and the
+table is trimmed to max_entries (oldest first).
+
+Modes (CRM_LLM_CACHE_MODE):
+- off:    no caching
+- read:   serve cached responses, never store new ones
+- write:  always call the LLM and store (refresh) the response
+- replay: serve cached responses and store responses on a miss
+"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.config import settings
+
+
+CACHE_MODES = ("off", "read", "write", "replay")
+
+# Writes between prune passes of the persistent LLM cache
+PRUNE_EVERY = 100
+
+
+class LLMResponseCache:
+    """SQLite table of (prompt_hash, task, response, created_at)."""
+    
+    def __init__(
+        self,
+        path: str,
+        mode: str = "off",
+        max_age: float = 86400.0,
+        max_entries: int = 10_000
+    ):
+        if mode not in CACHE_MODES:
+            print(f"⚠️ Unknown CRM_LLM_CACHE_MODE '{mode}', caching disabled")
+            mode = "off"
+        self.path = path
+        self.mode = mode
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+    
+    @property
+    def readable(self) -> bool:
+        return self.mode in ("read", "replay")
+    
+    @property
+    def writable(self) -> bool:
+        return self.mode in ("write", "replay")
+    
+    @staticmethod
+    def make_key(*parts: str) -> bytes:
+        """Hash prompt inputs (NUL-separated) into a 16-byte key."""
+        return hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=16).digest()
+    
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    prompt_hash BLOB PRIMARY KEY,
+                    task TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+    
+    def get(self, key: bytes) -> Optional[str]:
+        """Return the cached response for key, or None (also if expired)."""
+        if not self.readable:
+            return None
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT response FROM llm_cache WHERE prompt_hash = ? AND created_at >= ?",
+                    (key, time.time() - self.max_age)
+                ).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache read error: {e}")
+            return None
+    
+    def put(self, key: bytes, task: str, response: str) -> None:
+        """Store a response for key."""
+        if not self.writable:
+            return
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (prompt_hash, task, response, created_at) VALUES (?, ?, ?, ?)",
+                    (key, task, response, time.time())
+                )
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._prune(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache write error: {e}")
+    
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """Delete expired entries, then the oldest beyond max_entries."""
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.max_age,))
+        conn.execute("""
+            DELETE FROM llm_cache WHERE prompt_hash IN (
+                SELECT prompt_hash FROM llm_cache
+                ORDER BY created_at DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+    
+    def clear(self) -> None:
+        """Delete all cached responses."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Get the process-wide persistent LLM cache."""
+    global _llm_cache
+    
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache(
+            path=settings.crm_llm_cache_path,
+            mode=settings.crm_llm_cache_mode.lower(),
+            max_age=settings.crm_llm_cache_max_age,
+            max_entries=settings.crm_llm_cache_max_entries
+        )
+    
+    return _llm_cache
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after ttl seconds.
+    Keys are compared as strings (UUIDs and their str() form match).
+    """
+    
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry."""
+        with self._lock:
+            self._entries[str(key)] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(str(key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one entry (call after writing the underlying rows)."""
+        with self._lock:
+            self._entries.pop(str(key), None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Contact/lead context rows used to build prompts, keyed by id
+contact_context_cache = TTLCache(settings.context_cache_size, settings.context_cache_ttl)
+lead_context_cache = TTLCache(settings.context_cache_size, settings.context_cache_ttl)
+# Contact + account + open opportunity rows for meeting scheduling, keyed by contact id
+meeting_contact_cache = TTLCache(settings.context_cache_size, settings.context_cache_ttl)
@@ -2,22 +2,34 @@
 Database connection and session management for the Agentic CRM.
 """
 
+import io
+import re
+import asyncio
+import hashlib
+import threading
+import weakref
 from contextlib import contextmanager
-from typing import Generator
+from functools import lru_cache
+from typing import Any, Generator, List, Sequence, Tuple, Union
 
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
 from sqlalchemy.pool import QueuePool
 
 from app.config import settings
 
 
-# Create database engine
+# Create database engine (one persistent connection pool per process)
 engine = create_engine(
     settings.database_url,
     poolclass=QueuePool,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+    pool_use_lifo=True,  # Reuse the warmest connections; idle extras can time out
     pool_pre_ping=True,  # Verify connections before use
     echo=settings.app_debug  # Log SQL in debug mode
 )
@@ -28,6 +40,19 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base class for ORM models
 Base = declarative_base()
 
+# Raw SQL, or a text() statement built once and reused
+SQL = Union[str, TextClause]
+
+
+@lru_cache(maxsize=512)
+def _cached_text(query: str) -> TextClause:
+    """text() for a raw SQL string, built once per distinct string."""
+    return text(query)
+
+
+def _as_text(query: SQL) -> TextClause:
+    return _cached_text(query) if isinstance(query, str) else query
+
 
 def get_db() -> Generator[Session, None, None]:
     """
@@ -57,28 +82,225 @@ def get_db_context() -> Generator[Session, None, None]:
         db.close()
 
 
-def execute_query(query: str, params: dict = None) -> list:
+def execute_query(query: SQL, params: dict = None) -> list:
     """
     Execute a raw SQL query and return results as a list of dicts.
     Used by the NL Query Agent.
     """
     with get_db_context() as db:
-        result = db.execute(text(query), params or {})
+        result = db.execute(_as_text(query), params or {})
         columns = result.keys()
         return [dict(zip(columns, row)) for row in result.fetchall()]
 
 
-def execute_write(query: str, params: dict = None) -> int:
+# A LIMIT ending the statement (a LIMIT in a subquery doesn't bound the outer rows)
+_TRAILING_LIMIT_RE = re.compile(r'\bLIMIT\s+\d+(?:\s+OFFSET\s+\d+)?\s*;?\s*$', re.IGNORECASE)
+
+
+def limit_rows(query: str, cap: int) -> str:
+    """
+    Wrap a SELECT to return at most `cap` rows, unless it already ends in a
+    LIMIT. The inner query goes on its own lines, so a trailing -- comment
+    can't swallow the closing parenthesis.
+    """
+    query = query.strip().rstrip(';').rstrip()
+    if _TRAILING_LIMIT_RE.search(query):
+        return query
+    return f"SELECT * FROM (\n{query}\n) _capped LIMIT {cap}"
+
+
+def execute_query_capped(query: SQL, params: dict = None, cap: int = 100) -> list:
+    """
+    Execute a raw SQL query and return at most `cap` rows as dicts.
+    
+    Uses a server-side (named) cursor, so the driver fetches rows in pages
+    instead of buffering the whole result set client-side.
+    """
+    options = {"stream_results": True, "max_row_buffer": min(cap, 200)}
+    with engine.connect().execution_options(**options) as conn:
+        result = conn.execute(_as_text(query), params or {})
+        columns = result.keys()
+        rows = result.fetchmany(cap)
+        result.close()
+        return [dict(zip(columns, row)) for row in rows]
+
+
+# Cap on server-side prepared statements kept per pooled connection
+MAX_PREPARED_PER_CONNECTION = 256
+
+
+def execute_prepared(query: str) -> list:
+    """
+    Execute a parameterless SELECT through a server-side prepared statement.
+    
+    Statement names are derived from a hash of the SQL and tracked in the
+    pooled connection's info dict (prepared statements live per connection),
+    so repeat query shapes on a warm connection skip parse and planning.
+    """
+    name = "agentflow_" + hashlib.sha1(query.encode()).hexdigest()[:16]
+    
+    # no_parameters: hand the SQL to the driver as-is (no %-formatting)
+    with engine.connect().execution_options(no_parameters=True) as conn:
+        prepared = conn.info.setdefault("prepared_statements", set())
+        if name not in prepared:
+            if len(prepared) >= MAX_PREPARED_PER_CONNECTION:
+                conn.exec_driver_sql("DEALLOCATE ALL")
+                prepared.clear()
+            conn.exec_driver_sql(f"PREPARE {name} AS {query}")
+            prepared.add(name)
+        
+        result = conn.exec_driver_sql(f"EXECUTE {name}")
+        columns = result.keys()
+        return [dict(zip(columns, row)) for row in result.fetchall()]
+
+
+def execute_write(query: SQL, params: dict = None) -> int:
     """
     Execute a write operation (INSERT/UPDATE/DELETE).
     Returns the number of affected rows.
     """
     with get_db_context() as db:
-        result = db.execute(text(query), params or {})
+        result = db.execute(_as_text(query), params or {})
         db.commit()
         return result.rowcount
 
 
+def execute_write_returning(query: SQL, params: dict = None) -> list:
+    """
+    Execute a write with a RETURNING clause (or a data-modifying CTE)
+    and commit. Returns the returned rows as dicts.
+    """
+    with get_db_context() as db:
+        result = db.execute(_as_text(query), params or {})
+        columns = result.keys()
+        rows = [dict(zip(columns, row)) for row in result.fetchall()]
+        db.commit()
+        return rows
+
+
+def execute_write_batch(statements: List[Tuple[SQL, List[dict]]]) -> int:
+    """
+    Execute write statements in a single transaction. Each statement runs
+    once per parameter dict, sent to the driver as one executemany batch.
+    Returns the number of affected rows reported by the driver.
+    """
+    total = 0
+    with get_db_context() as db:
+        for query, params_list in statements:
+            if params_list:
+                total += db.execute(_as_text(query), params_list).rowcount
+        db.commit()
+    return total
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(value: Any) -> str:
+    """Render one value in COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def copy_rows(table: str, columns: Sequence[str], rows: List[dict]) -> int:
+    """
+    Bulk-insert rows with COPY ... FROM STDIN (one statement, no per-row
+    parse/plan). Values are taken from each row dict by column name and
+    must be castable from text by Postgres. Returns the number of rows.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row.get(column)) for column in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(rows)
+
+
+# Async engines (asyncpg), one per event loop: asyncpg connections are bound
+# to the loop that opened them (in the app that is one engine for the server loop)
+_async_engines: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncEngine]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_engine_lock = threading.Lock()
+
+
+def get_async_engine() -> AsyncEngine:
+    """Get the asyncpg engine for the running event loop."""
+    loop = asyncio.get_running_loop()
+    
+    with _async_engine_lock:
+        async_engine = _async_engines.get(loop)
+        if async_engine is None:
+            async_engine = create_async_engine(
+                make_url(settings.database_url).set(drivername="postgresql+asyncpg"),
+                pool_size=settings.db_async_pool_size,
+                max_overflow=settings.db_async_max_overflow,
+                pool_recycle=settings.db_pool_recycle,
+                pool_pre_ping=True,
+                echo=settings.app_debug
+            )
+            _async_engines[loop] = async_engine
+    return async_engine
+
+
+async def aexecute_query(query: SQL, params: dict = None) -> list:
+    """
+    Async execute_query(): awaits the DB roundtrip instead of blocking the
+    event loop, so concurrent agent tasks keep running meanwhile.
+    """
+    async with get_async_engine().connect() as conn:
+        result = await conn.execute(_as_text(query), params or {})
+        return [dict(row) for row in result.mappings().all()]
+
+
+async def adispose_engine() -> None:
+    """Close the running loop's async connection pool (application shutdown)."""
+    with _async_engine_lock:
+        async_engine = _async_engines.pop(asyncio.get_running_loop(), None)
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+def warm_pool(count: int = None) -> int:
+    """
+    Open `count` pooled connections up front (default DB_POOL_MIN_SIZE),
+    so the first requests skip the TCP/TLS/auth handshake.
+    Returns the number of connections opened.
+    """
+    count = min(count or settings.db_pool_min_size, settings.db_pool_size)
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(engine.connect())
+    except Exception as e:
+        print(f"Connection pool warm-up stopped early: {e}")
+    finally:
+        for conn in connections:
+            conn.close()  # returns it to the pool
+    return len(connections)
+
+
+def dispose_engine() -> None:
+    """Close all pooled connections (application shutdown)."""
+    engine.dispose()
+
+
 def test_connection() -> bool:
     """Test database connectivity."""
     try:
@@ -3,12 +3,90 @@ Azure OpenAI LLM Engine for AgentFlow integration.
 Provides a custom LLM engine that uses Azure OpenAI endpoints.
 """
 
-from typing import Optional, List, Dict, Any
-from openai import AzureOpenAI
+import re
+import math
+import time
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple, Callable, Type
+import httpx
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from pydantic import BaseModel
 
 from app.config import settings
 
 
+# ============================================
+# SHARED CLIENTS
+# ============================================
+
+# One connection pool per process (per event loop for the async client),
+# shared by every engine/agent
+_client: Optional[AzureOpenAI] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAzureOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+_client_lock = threading.Lock()
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections
+    )
+
+
+def get_azure_client() -> AzureOpenAI:
+    """Get the process-wide Azure OpenAI client."""
+    global _client
+    
+    with _client_lock:
+        if _client is None:
+            _client = AzureOpenAI(
+                api_key=settings.azure_openai_api_key,
+                api_version=settings.azure_openai_api_version,
+                azure_endpoint=settings.azure_openai_endpoint,
+                http_client=httpx.Client(limits=_http_limits())
+            )
+    return _client
+
+
+def get_async_azure_client() -> AsyncAzureOpenAI:
+    """
+    Get the async Azure OpenAI client for the running event loop.
+    Pooled connections are bound to a loop, so each loop gets its own client
+    (in the app that is one client for the server loop).
+    """
+    loop = asyncio.get_running_loop()
+    
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = AsyncAzureOpenAI(
+                api_key=settings.azure_openai_api_key,
+                api_version=settings.azure_openai_api_version,
+                azure_endpoint=settings.azure_openai_endpoint,
+                http_client=httpx.AsyncClient(limits=_http_limits())
+            )
+            _async_clients[loop] = client
+    return client
+
+
+def _usage_dict(usage: Any) -> Optional[Dict[str, int]]:
+    """Prompt/completion/cached token counts from a completion's usage."""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0
+    }
+
+
 class AzureOpenAIEngine:
     """
     Custom LLM engine for AgentFlow that uses Azure OpenAI.
@@ -22,16 +100,26 @@ class AzureOpenAIEngine:
         max_tokens: int = 4000,
         is_multimodal: bool = False
     ):
-        self.client = AzureOpenAI(
-            api_key=settings.azure_openai_api_key,
-            api_version=settings.azure_openai_api_version,
-            azure_endpoint=settings.azure_openai_endpoint
-        )
+        self.client = get_azure_client()
         self.deployment_name = deployment_name or settings.azure_openai_deployment_name
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.is_multimodal = is_multimodal
         self.model_string = f"azure-{self.deployment_name}"
+        self._usage = threading.local()
+    
+    @property
+    def last_usage(self) -> Optional[Dict[str, int]]:
+        """
+        Token usage of this thread's last generate() call; cached_tokens is
+        the prompt prefix served from Azure's prompt cache.
+        """
+        return getattr(self._usage, "value", None)
+    
+    @property
+    def async_client(self) -> AsyncAzureOpenAI:
+        """Shared async client for the running event loop."""
+        return get_async_azure_client()
     
     def generate(
         self,
@@ -39,7 +127,8 @@ class AzureOpenAIEngine:
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
-        stop: Optional[List[str]] = None
+        stop: Optional[List[str]] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Generate a completion from the Azure OpenAI model.
@@ -50,6 +139,7 @@ class AzureOpenAIEngine:
             temperature: Override default temperature
             max_tokens: Override default max tokens
             stop: Optional stop sequences
+            response_format: Optional response format, e.g. {"type": "json_object"}
             
         Returns:
             The generated text response
@@ -61,6 +151,9 @@ class AzureOpenAIEngine:
         
         messages.append({"role": "user", "content": prompt})
         
+        extra = {"response_format": response_format} if response_format else {}
+        self._usage.value = None
+        
         try:
             # Use max_completion_tokens for newer models (O1/GPT-5 class)
             response = self.client.chat.completions.create(
@@ -68,15 +161,98 @@ class AzureOpenAIEngine:
                 messages=messages,
                 temperature=temperature if temperature is not None else self.temperature,
                 max_completion_tokens=max_tokens if max_tokens is not None else self.max_tokens,
-                stop=stop
+                stop=stop,
+                **extra
             )
             
+            self._usage.value = _usage_dict(response.usage)
             return response.choices[0].message.content
         except Exception as e:
             # Log the error and return a fallback response
             print(f"⚠️ LLM Error: {str(e)}")
             return f"[LLM Unavailable - Error: {str(e)[:100]}]"
     
+    def generate_until(
+        self,
+        prompt: str,
+        stop_when: Callable[[str], bool],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Stream a completion and close the stream as soon as stop_when(text)
+        is true for the text so far (checked at line boundaries).
+        """
+        messages = []
+        
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        
+        messages.append({"role": "user", "content": prompt})
+        
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.deployment_name,
+                messages=messages,
+                temperature=temperature if temperature is not None else self.temperature,
+                max_completion_tokens=max_tokens if max_tokens is not None else self.max_tokens,
+                stream=True
+            )
+            
+            parts: List[str] = []
+            try:
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    if "\n" in delta and stop_when("".join(parts)):
+                        break
+            finally:
+                stream.close()
+            
+            return "".join(parts)
+        except Exception as e:
+            print(f"⚠️ LLM Error: {str(e)}")
+            return f"[LLM Unavailable - Error: {str(e)[:100]}]"
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        stop: Optional[List[str]] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Async variant of generate() that does not block the event loop."""
+        messages = []
+        
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        
+        messages.append({"role": "user", "content": prompt})
+        
+        extra = {"response_format": response_format} if response_format else {}
+        
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.deployment_name,
+                messages=messages,
+                temperature=temperature if temperature is not None else self.temperature,
+                max_completion_tokens=max_tokens if max_tokens is not None else self.max_tokens,
+                stop=stop,
+                **extra
+            )
+            
+            return response.choices[0].message.content
+        except Exception as e:
+            print(f"⚠️ LLM Error: {str(e)}")
+            return f"[LLM Unavailable - Error: {str(e)[:100]}]"
+    
     def generate_with_messages(
         self,
         messages: List[Dict[str, str]],
@@ -159,11 +335,276 @@ def create_gpt5_engine(temperature: float = 1.0) -> AzureOpenAIEngine:
     )
 
 
+@lru_cache(maxsize=8)
+def get_engine(temperature: float = 0.0, deployment_name: Optional[str] = None) -> AzureOpenAIEngine:
+    """
+    Shared engine per (temperature, deployment), so agents and tools built
+    per request reuse one instance (and the process-wide client pool).
+    """
+    return create_azure_engine(deployment_name=deployment_name, temperature=temperature)
+
+
+def json_schema_format(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    response_format that constrains the completion to the model's JSON schema
+    (structured outputs). The model should forbid extra fields, as strict
+    mode requires.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": model.__name__,
+            "schema": model.model_json_schema(),
+            "strict": True
+        }
+    }
+
+
+# ============================================
+# RESPONSE CACHE
+# ============================================
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_ABBREVIATION_RE = re.compile(r'\b(opps?|accts?|mtgs?|rev)\b')
+_ABBREVIATIONS = {
+    "opp": "opportunity",
+    "opps": "opportunities",
+    "acct": "account",
+    "accts": "accounts",
+    "mtg": "meeting",
+    "mtgs": "meetings",
+    "rev": "revenue",
+}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and expand common CRM abbreviations."""
+    text = _WHITESPACE_RE.sub(" ", prompt.lower()).strip()
+    return _ABBREVIATION_RE.sub(lambda m: _ABBREVIATIONS[m.group(1)], text)
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    """Cosine similarity of two vectors."""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """
+    Two-tier LLM completion cache: exact match on the normalized prompt,
+    then (optionally) embedding similarity over a flat in-process index.
+    Keys include the system prompt and max_tokens. With ttl set, entries
+    expire after ttl seconds.
+    """
+    
+    def __init__(
+        self, max_entries: int = 512, similarity_threshold: float = 0.95,
+        ttl: Optional[float] = None
+    ):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, int, str], Tuple[Optional[float], Any]]" = OrderedDict()
+        self._vectors: "OrderedDict[Tuple[str, int, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _live(self, key: Tuple[str, int, str]) -> bool:
+        """Whether key is cached and unexpired (drops it if expired); caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if entry[0] is not None and entry[0] < time.monotonic():
+            del self._entries[key]
+            self._vectors.pop(key, None)
+            return False
+        return True
+    
+    def get(
+        self, system_prompt: Optional[str], max_tokens: int, prompt: str,
+        vector: Optional[List[float]] = None
+    ) -> Optional[Any]:
+        """Return a cached completion, or None on a miss."""
+        key = (system_prompt or "", max_tokens, normalize_prompt(prompt))
+        with self._lock:
+            if self._live(key):
+                self._entries.move_to_end(key)
+                return self._entries[key][1]
+            if vector is None:
+                return None
+            best_key, best_score = None, self.similarity_threshold
+            for other_key, other_vector in list(self._vectors.items()):
+                if other_key[:2] != key[:2] or not self._live(other_key):
+                    continue
+                score = _cosine(vector, other_vector)
+                if score >= best_score:
+                    best_key, best_score = other_key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][1]
+    
+    def put(
+        self, system_prompt: Optional[str], max_tokens: int, prompt: str,
+        response: Any, vector: Optional[List[float]] = None
+    ) -> None:
+        """Store a completion, evicting the least recently used entry."""
+        key = (system_prompt or "", max_tokens, normalize_prompt(prompt))
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, response)
+            self._entries.move_to_end(key)
+            if vector is not None:
+                self._vectors[key] = vector
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._vectors.pop(old_key, None)
+    
+    def clear(self) -> None:
+        """Drop all cached completions."""
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+
+
+_response_cache = ResponseCache(
+    max_entries=settings.llm_response_cache_size,
+    similarity_threshold=settings.llm_semantic_cache_threshold
+)
+
+
+class CachedLLM:
+    """
+    Engine wrapper that serves repeat generate() calls from a ResponseCache.
+    
+    Exact matches are always reused; near-identical prompts (same system
+    prompt, deployment and temperature) are reused by embedding similarity
+    when settings.llm_semantic_cache is enabled. Other engine attributes
+    pass through unchanged.
+    """
+    
+    def __init__(
+        self,
+        engine: AzureOpenAIEngine,
+        cache: Optional[ResponseCache] = None,
+        semantic: Optional[bool] = None
+    ):
+        self.engine = engine
+        self.cache = cache or ResponseCache(
+            max_entries=settings.llm_response_cache_size,
+            similarity_threshold=settings.llm_semantic_cache_threshold
+        )
+        self.semantic = settings.llm_semantic_cache if semantic is None else semantic
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.engine, name)
+    
+    def _scope(
+        self, system_prompt: Optional[str], temperature: Optional[float],
+        response_format: Optional[Dict[str, Any]]
+    ) -> str:
+        """Cache scope: only same-deployment/temperature/format calls match."""
+        temperature = temperature if temperature is not None else self.engine.temperature
+        return "\0".join((
+            self.engine.deployment_name, str(temperature),
+            str(response_format or ""), system_prompt or ""
+        ))
+    
+    def _embed(self, prompt: str) -> Optional[List[float]]:
+        try:
+            return self.engine.get_embedding(normalize_prompt(prompt))
+        except Exception as e:
+            print(f"⚠️ Embedding Error: {str(e)}")
+            return None
+    
+    def _store(self, scope: str, max_tokens: int, prompt: str, response: str, vector) -> None:
+        if response and not response.startswith("[LLM Unavailable"):
+            self.cache.put(scope, max_tokens, prompt, response, vector)
+    
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        stop: Optional[List[str]] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Cached AzureOpenAIEngine.generate()."""
+        if stop:
+            return self.engine.generate(
+                prompt, system_prompt, temperature, max_tokens, stop, response_format
+            )
+        
+        scope = self._scope(system_prompt, temperature, response_format)
+        max_tokens = max_tokens if max_tokens is not None else self.engine.max_tokens
+        
+        cached = self.cache.get(scope, max_tokens, prompt)
+        if cached is not None:
+            return cached
+        
+        vector = self._embed(prompt) if self.semantic else None
+        if vector is not None:
+            cached = self.cache.get(scope, max_tokens, prompt, vector)
+            if cached is not None:
+                return cached
+        
+        response = self.engine.generate(
+            prompt, system_prompt, temperature, max_tokens, None, response_format
+        )
+        self._store(scope, max_tokens, prompt, response, vector)
+        
+        return response
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        stop: Optional[List[str]] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Cached AzureOpenAIEngine.agenerate()."""
+        if stop:
+            return await self.engine.agenerate(
+                prompt, system_prompt, temperature, max_tokens, stop, response_format
+            )
+        
+        scope = self._scope(system_prompt, temperature, response_format)
+        max_tokens = max_tokens if max_tokens is not None else self.engine.max_tokens
+        
+        cached = self.cache.get(scope, max_tokens, prompt)
+        if cached is not None:
+            return cached
+        
+        vector = await asyncio.to_thread(self._embed, prompt) if self.semantic else None
+        if vector is not None:
+            cached = self.cache.get(scope, max_tokens, prompt, vector)
+            if cached is not None:
+                return cached
+        
+        response = await self.engine.agenerate(
+            prompt, system_prompt, temperature, max_tokens, None, response_format
+        )
+        self._store(scope, max_tokens, prompt, response, vector)
+        
+        return response
+
+
 # Singleton engine instance for simple function calls
 _default_engine: Optional[AzureOpenAIEngine] = None
 
 
-def get_llm_response(prompt: str, max_tokens: int = 1000, system_prompt: Optional[str] = None) -> str:
+def get_llm_response(
+    prompt: str,
+    max_tokens: int = 1000,
+    system_prompt: Optional[str] = None,
+    cache: bool = False,
+    semantic: bool = False,
+    stop_when: Optional[Callable[[str], bool]] = None,
+    json_mode: bool = False
+) -> str:
     """
     Simple function to get LLM response without managing engine instances.
     Used by AgentFlow solver components.
@@ -172,6 +613,12 @@ def get_llm_response(prompt: str, max_tokens: int = 1000, system_prompt: Optiona
         prompt: The prompt to send
         max_tokens: Maximum tokens in response
         system_prompt: Optional system prompt
+        cache: Reuse a previous completion for the same (normalized) prompt
+        semantic: Also match near-identical prompts by embedding similarity
+            (only when settings.llm_semantic_cache is enabled)
+        stop_when: Stream the response and stop once this returns True
+            for the text received so far
+        json_mode: Ask the model for a single JSON object
         
     Returns:
         The LLM response text
@@ -181,8 +628,65 @@ def get_llm_response(prompt: str, max_tokens: int = 1000, system_prompt: Optiona
     if _default_engine is None:
         _default_engine = AzureOpenAIEngine(temperature=1.0)  # GPT-5.2 only supports temp=1
     
-    return _default_engine.generate(
+    vector = None
+    if cache:
+        if semantic and settings.llm_semantic_cache:
+            try:
+                vector = _default_engine.get_embedding(normalize_prompt(prompt))
+            except Exception as e:
+                print(f"⚠️ Embedding Error: {str(e)}")
+        cached = _response_cache.get(system_prompt, max_tokens, prompt, vector)
+        if cached is not None:
+            return cached
+    
+    if stop_when is not None:
+        response = _default_engine.generate_until(
+            prompt=prompt,
+            stop_when=stop_when,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens
+        )
+    else:
+        response = _default_engine.generate(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"} if json_mode else None
+        )
+    
+    if cache and response and not response.startswith("[LLM Unavailable"):
+        _response_cache.put(system_prompt, max_tokens, prompt, response, vector)
+    
+    return response
+
+
+async def get_llm_response_async(
+    prompt: str,
+    max_tokens: int = 1000,
+    system_prompt: Optional[str] = None,
+    cache: bool = False
+) -> str:
+    """
+    Async variant of get_llm_response() for use inside an event loop.
+    Shares the same default engine and exact-match response cache.
+    """
+    global _default_engine
+    
+    if _default_engine is None:
+        _default_engine = AzureOpenAIEngine(temperature=1.0)  # GPT-5.2 only supports temp=1
+    
+    if cache:
+        cached = _response_cache.get(system_prompt, max_tokens, prompt)
+        if cached is not None:
+            return cached
+    
+    response = await _default_engine.agenerate(
         prompt=prompt,
         system_prompt=system_prompt,
         max_tokens=max_tokens
     )
+    
+    if cache and response and not response.startswith("[LLM Unavailable"):
+        _response_cache.put(system_prompt, max_tokens, prompt, response)
+    
+    return response
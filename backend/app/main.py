@@ -3,17 +3,21 @@ Agentic CRM - FastAPI Backend
 Main application entry point with all API endpoints.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from typing import Optional, List
 from datetime import datetime
 
+import orjson
 from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
 from app.config import settings
-from app.database import test_connection, get_db
+from app.database import test_connection, get_db, warm_pool, dispose_engine, adispose_engine
+from app.agent_logs import get_agent_log_writer
 
 # Import agents
 from app.agents.lead_agent import LeadScoringAgent
@@ -84,9 +88,13 @@ async def lifespan(app: FastAPI):
     # Test database connection
     if test_connection():
         print("✅ Database connection successful")
+        print(f"   Connection pool warmed: {warm_pool()} connections")
     else:
         print("❌ Database connection failed - check your configuration")
     
+    # Agent audit logs are written in the background, off the request path
+    get_agent_log_writer().start()
+    
     # Initialize agents
     app.state.lead_agent = LeadScoringAgent(verbose=settings.agentflow_verbose)
     app.state.followup_agent = FollowUpAgent(verbose=settings.agentflow_verbose)
@@ -104,13 +112,16 @@ async def lifespan(app: FastAPI):
     solver_type = "Full SDK" if USE_FULL_AGENTFLOW else "Simplified"
     print(f"✅ AI Agents initialized (AgentFlow {solver_type})")
     print("   Components: Planner, Executor, Verifier, Memory")
-    print(f"   Tools: CRM_Database_Query, CRM_Analytics, CRM_Reasoning")
+    print(f"   Tools: CRM_Database_Query, CRM_Analytics, CRM_Analytics_Batch, CRM_Reasoning")
     print(f"🌐 Server running at http://{settings.app_host}:{settings.app_port}")
     
     yield
     
     # Shutdown
     print("👋 Shutting down Agentic CRM Backend...")
+    get_agent_log_writer().stop()  # flush queued agent_logs rows
+    dispose_engine()
+    await adispose_engine()
 
 
 app = FastAPI(
@@ -173,7 +184,7 @@ async def natural_language_query(request: NLQueryRequest):
     try:
         # Use AgentFlow solver (Planner→Executor→Verifier flow)
         solver = app.state.agentflow_solver
-        result = solver.solve(request.query)
+        result = await solver.solve_async(request.query)
         
         if not result.get("success"):
             return {
@@ -199,6 +210,56 @@ async def natural_language_query(request: NLQueryRequest):
         }
 
 
+def _sse(event: str, data) -> bytes:
+    """Format one server-sent event."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data, default=str) + b"\n\n"
+
+
+@app.post("/api/agent/query/stream", tags=["NL Query"])
+async def natural_language_query_stream(request: NLQueryRequest):
+    """
+    Same as /api/agent/query, streamed as server-sent events:
+    one "step" event per reasoning step as it happens, then a "result"
+    event with the final response (without the already-sent steps).
+    """
+    solver = app.state.agentflow_solver
+    loop = asyncio.get_running_loop()
+    steps: asyncio.Queue = asyncio.Queue()
+    
+    def on_step(step: dict) -> None:
+        # Called from the solver's worker thread
+        loop.call_soon_threadsafe(steps.put_nowait, step)
+    
+    async def run() -> dict:
+        try:
+            if USE_FULL_AGENTFLOW:
+                return await solver.solve_async(request.query, on_step=on_step)
+            return await solver.solve_async(request.query)
+        finally:
+            loop.call_soon_threadsafe(steps.put_nowait, None)
+    
+    async def events():
+        task = asyncio.create_task(run())
+        streamed = 0
+        while (step := await steps.get()) is not None:
+            streamed += 1
+            yield _sse("step", step)
+        
+        try:
+            result = await task
+        except Exception as e:
+            print(f"❌ Query stream error: {str(e)}")
+            result = {"success": False, "error": str(e), "query": request.query, "results": [], "result_count": 0}
+        
+        # The fallback solver has no step callback: send its steps now
+        for step in result.get("reasoning_steps", [])[streamed:]:
+            yield _sse("step", step)
+        
+        yield _sse("result", {key: value for key, value in result.items() if key != "reasoning_steps"})
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.get("/api/agent/query/examples", tags=["NL Query"])
 async def get_query_examples():
     """Get example natural language queries."""
@@ -233,7 +294,7 @@ async def score_lead(request: LeadScoreRequest):
 async def batch_score_leads(limit: int = Query(default=50, le=100)):
     """Score all unscored new leads."""
     agent = app.state.lead_agent
-    return agent.batch_score_new_leads(limit)
+    return await agent.abatch_score_new_leads(limit)
 
 
 @app.post("/api/agent/route-leads", tags=["Lead Scoring"])
@@ -268,7 +329,7 @@ async def draft_email(request: EmailDraftRequest):
 async def generate_email_sequence(request: EmailSequenceRequest):
     """Generate a complete email sequence."""
     agent = app.state.email_agent
-    return agent.generate_sequence(
+    return await agent.agenerate_sequence(
         contact_id=request.contact_id,
         sequence_type=request.sequence_type,
         email_count=request.email_count
@@ -297,7 +358,7 @@ async def email_analytics(days: int = Query(default=30, le=365)):
 async def schedule_meeting(request: ScheduleMeetingRequest):
     """Schedule a meeting with AI-optimized timing."""
     agent = app.state.meeting_agent
-    result = agent.schedule_meeting(
+    result = await agent.aschedule_meeting(
         contact_id=request.contact_id,
         meeting_type=request.meeting_type,
         deal_id=request.deal_id,
@@ -357,7 +418,7 @@ async def get_pipeline_health():
 async def trigger_followups():
     """Run the follow-up automation agent."""
     agent = app.state.followup_agent
-    return agent.check_and_trigger_followups()
+    return await agent.acheck_and_trigger_followups()
 
 
 @app.get("/api/followup/analytics", tags=["Follow-up"])
@@ -7,8 +7,47 @@ from typing import Any, Dict, List, Optional
 from datetime import datetime, timedelta
 import json
 
-from app.llm_engine import create_azure_engine
-from app.database import execute_query, execute_write
+from sqlalchemy import text
+
+from app.llm_engine import get_engine
+from app.database import execute_query, execute_write, execute_write_returning
+
+
+# Statements parsed once at import and reused on every call
+_Q_BOOKED_SLOTS = text("""
+    SELECT start_time, end_time FROM meetings
+    WHERE start_time >= NOW()
+    AND start_time < NOW() + make_interval(days => :days)
+    AND status != 'cancelled'
+    ORDER BY start_time
+""")
+
+# Insert and read back the generated id/created_at in one committed statement
+_Q_CREATE_MEETING = text("""
+    INSERT INTO meetings (
+        title, meeting_type, start_time, end_time,
+        contact_id, opportunity_id, status, ai_suggested
+    ) VALUES (
+        :title, :type, :start, :end,
+        :contact_id, :opportunity_id, 'scheduled', :ai_suggested
+    )
+    RETURNING id, created_at
+""")
+
+# Meetings with their contact and account in one roundtrip
+_Q_UPCOMING_MEETINGS = text("""
+    SELECT 
+        m.*,
+        c.first_name, c.last_name, c.email,
+        a.account_name
+    FROM meetings m
+    LEFT JOIN contacts c ON m.contact_id = c.contact_id
+    LEFT JOIN accounts a ON c.account_id = a.account_id
+    WHERE m.start_time >= NOW()
+    AND m.start_time < NOW() + make_interval(days => :days)
+    AND m.status != 'cancelled'
+    ORDER BY m.start_time
+""")
 
 
 class CalendarTool:
@@ -26,7 +65,7 @@ class CalendarTool:
     
     def __init__(self, verbose: bool = True):
         self.verbose = verbose
-        self.llm = create_azure_engine(temperature=0.3)
+        self.llm = get_engine(0.3)
     
     def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Execute calendar operation."""
@@ -59,14 +98,7 @@ class CalendarTool:
         days_ahead = params.get("days_ahead", 7)
         
         # Get existing meetings
-        query = """
-            SELECT start_time, end_time FROM meetings
-            WHERE start_time >= NOW()
-            AND start_time < NOW() + INTERVAL ':days days'
-            AND status != 'cancelled'
-            ORDER BY start_time
-        """
-        existing = execute_query(query.replace(":days", str(days_ahead)), {})
+        existing = execute_query(_Q_BOOKED_SLOTS, {"days": int(days_ahead)})
         
         # Generate available slots (9 AM - 5 PM business hours)
         slots = []
@@ -127,18 +159,7 @@ class CalendarTool:
         end_time = start_time + timedelta(minutes=duration_minutes)
         
         # Create meeting
-        sql = """
-            INSERT INTO meetings (
-                title, meeting_type, start_time, end_time,
-                contact_id, opportunity_id, status, ai_suggested
-            ) VALUES (
-                :title, :type, :start, :end,
-                :contact_id, :opportunity_id, 'scheduled', :ai_suggested
-            )
-            RETURNING id
-        """
-        
-        result = execute_query(sql, {
+        result = execute_write_returning(_Q_CREATE_MEETING, {
             "title": title,
             "type": meeting_type,
             "start": start_time,
@@ -149,6 +170,7 @@ class CalendarTool:
         })
         
         meeting_id = str(result[0]["id"]) if result else None
+        created_at = result[0]["created_at"] if result else None
         
         return {
             "success": True,
@@ -156,7 +178,8 @@ class CalendarTool:
                 "id": meeting_id,
                 "title": title,
                 "start_time": start_time.isoformat(),
-                "end_time": end_time.isoformat()
+                "end_time": end_time.isoformat(),
+                "created_at": created_at.isoformat() if created_at else None
             }
         }
     
@@ -213,20 +236,7 @@ Return JSON: {"best_slot_index": 0, "reasoning": "text"}"""
         """Get upcoming meetings."""
         days = params.get("days", 7)
         
-        query = """
-            SELECT 
-                m.*,
-                c.first_name, c.last_name, c.email,
-                a.account_name
-            FROM meetings m
-            LEFT JOIN contacts c ON m.contact_id = c.contact_id
-            LEFT JOIN accounts a ON c.account_id = a.account_id
-            WHERE m.start_time >= NOW()
-            AND m.start_time < NOW() + INTERVAL ':days days'
-            AND m.status != 'cancelled'
-            ORDER BY m.start_time
-        """
-        meetings = execute_query(query.replace(":days", str(days)), {})
+        meetings = execute_query(_Q_UPCOMING_MEETINGS, {"days": int(days)})
         
         return {
             "success": True,
@@ -7,7 +7,8 @@ from typing import Any, Dict, List, Optional
 import json
 from datetime import datetime
 
-from app.database import execute_query, execute_write
+from app.database import execute_query, execute_write, execute_write_returning
+from app.cache import contact_context_cache, lead_context_cache, meeting_contact_cache
 
 
 class DatabaseTool:
@@ -27,6 +28,15 @@ class DatabaseTool:
     def __init__(self, verbose: bool = True):
         self.verbose = verbose
     
+    @staticmethod
+    def invalidate(contact_id: Optional[str] = None, lead_id: Optional[str] = None) -> None:
+        """Drop cached prompt context after writing a contact or lead (or its activities)."""
+        if contact_id:
+            contact_context_cache.invalidate(contact_id)
+            meeting_contact_cache.invalidate(contact_id)
+        if lead_id:
+            lead_context_cache.invalidate(lead_id)
+    
     def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Execute database operation based on params."""
         
@@ -162,6 +172,7 @@ class DatabaseTool:
             "score": score,
             "qualification": qualification
         })
+        self.invalidate(lead_id=lead_id)
         
         return {"success": True, "lead_id": lead_id, "score": score}
     
@@ -172,6 +183,7 @@ class DatabaseTool:
         
         sql = "UPDATE leads SET lead_status = :status, updated_at = NOW() WHERE lead_id = :lead_id"
         execute_write(sql, {"lead_id": lead_id, "status": status})
+        self.invalidate(lead_id=lead_id)
         
         return {"success": True, "lead_id": lead_id, "status": status}
     
@@ -191,7 +203,7 @@ class DatabaseTool:
             RETURNING activity_id
         """
         
-        result = execute_query(sql, {
+        result = execute_write_returning(sql, {
             "type": params.get("activity_type", "Task"),
             "subject": params.get("subject", ""),
             "description": params.get("description", ""),
@@ -201,6 +213,8 @@ class DatabaseTool:
             "status": params.get("status", "Open"),
             "ai_generated": params.get("ai_generated", False)
         })
+        if params.get("related_to_type") == "Lead":
+            self.invalidate(lead_id=params.get("related_to_id"))
         
         return {
             "success": True,
@@ -7,7 +7,8 @@ from typing import Any, Dict, List, Optional
 import json
 from datetime import datetime
 
-from app.llm_engine import create_azure_engine
+from app.llm_engine import get_engine
+from app.cache import contact_context_cache
 from app.database import execute_query, execute_write
 
 
@@ -26,7 +27,7 @@ class EmailTool:
     
     def __init__(self, verbose: bool = True):
         self.verbose = verbose
-        self.llm = create_azure_engine(temperature=0.7)
+        self.llm = get_engine(0.7)
     
     def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Execute email operation."""
@@ -57,9 +58,11 @@ class EmailTool:
         email_type = params.get("email_type", "followup")
         context = params.get("context", "")
         
-        # Get contact info if provided
-        contact = None
-        if contact_id:
+        # Get contact info: pre-fetched by the caller, cached, or queried
+        contact = params.get("contact")
+        if contact is None and contact_id:
+            contact = contact_context_cache.get(contact_id)
+        if contact is None and contact_id:
             query = """
                 SELECT c.*, a.account_name, a.industry
                 FROM contacts c
@@ -69,10 +72,12 @@ class EmailTool:
             results = execute_query(query, {"contact_id": contact_id})
             if results:
                 contact = results[0]
+                contact_context_cache.put(contact_id, contact)
         
         # Build prompt
-        system_prompt = f"""You are a professional sales email writer.
-Write a {email_type} email that is:
+        # Static system prompt (cacheable prefix); the email type is in the prompt
+        system_prompt = """You are a professional sales email writer.
+Write an email of the given type that is:
 - Professional but personable
 - Concise (under 150 words)
 - Has a clear call-to-action
@@ -9,6 +9,7 @@ import json
 
 from app.llm_engine import create_gpt5_engine
 from app.database import execute_query, execute_write
+from app.tools.database_tool import DatabaseTool
 
 
 class MLTool:
@@ -95,6 +96,7 @@ class MLTool:
                 ai_score_updated_at = NOW()
             WHERE lead_id = :lead_id
         """, {"score": final_score, "qual": qualification, "lead_id": lead_id})
+        DatabaseTool.invalidate(lead_id=lead_id)
         
         return {
             "success": True,
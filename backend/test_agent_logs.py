@@ -0,0 +1,126 @@
+"""
+Unit tests for the background agent log writer's failure handling.
+
+The database writes are replaced with fakes; run with `pytest test_agent_logs.py`.
+"""
+
+import logging
+import os
+import sys
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+# Settings require these; nothing here talks to Azure
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+
+import app.agent_logs as agent_logs
+from app.agent_logs import AgentLogWriter, COPY_MIN_ROWS
+
+
+class _FakeDatabase:
+    """Records writes; batches fail if fail_batches, single rows fail if marked bad."""
+
+    def __init__(self, fail_batches=(), bad_actions=()):
+        self.fail_batches = set(fail_batches)
+        self.bad_actions = set(bad_actions)
+        self.batches = []
+        self.copies = []
+        self.rows = []
+
+    def execute_write_batch(self, statements):
+        for statement, rows in statements:
+            table = "agent_logs" if statement is agent_logs._Q_INSERT_AGENT_LOG else "nl_queries"
+            if table in self.fail_batches:
+                raise RuntimeError(f"{table} batch failed")
+            self.batches.append((table, list(rows)))
+
+    def copy_rows(self, table, columns, rows):
+        if table in self.fail_batches:
+            raise RuntimeError(f"{table} copy failed")
+        self.copies.append((table, list(rows)))
+
+    def execute_write(self, statement, row):
+        if row.get("action") in self.bad_actions or row.get("query_text") in self.bad_actions:
+            raise RuntimeError("invalid input syntax for type uuid")
+        self.rows.append(row)
+
+
+def _install(monkeypatch, db: _FakeDatabase) -> AgentLogWriter:
+    monkeypatch.setattr(agent_logs, "execute_write_batch", db.execute_write_batch)
+    monkeypatch.setattr(agent_logs, "copy_rows", db.copy_rows)
+    monkeypatch.setattr(agent_logs, "execute_write", db.execute_write)
+    return AgentLogWriter()
+
+
+def _log_row(action: str):
+    return ("agent_logs", {"agent_type": "test", "action": action, "success": True})
+
+
+def _query_row(text: str):
+    return ("nl_queries", {"query_text": text, "success": True})
+
+
+def test_batch_written_once_per_table(monkeypatch):
+    db = _FakeDatabase()
+    writer = _install(monkeypatch, db)
+
+    writer._write([_log_row("a"), _query_row("q"), _log_row("b")])
+
+    assert [(table, len(rows)) for table, rows in db.batches] == [("agent_logs", 2), ("nl_queries", 1)]
+    assert db.rows == []
+
+
+def test_failed_batch_retried_row_by_row(monkeypatch, caplog):
+    db = _FakeDatabase(fail_batches={"agent_logs"}, bad_actions={"bad"})
+    writer = _install(monkeypatch, db)
+
+    with caplog.at_level(logging.WARNING, logger="agent_logs"):
+        writer._write([_log_row("a"), _log_row("bad"), _log_row("b")])
+
+    assert [row["action"] for row in db.rows] == ["a", "b"]
+    assert "1 of 3 rows dropped" in caplog.text
+
+
+def test_one_table_failure_does_not_drop_the_other(monkeypatch):
+    db = _FakeDatabase(fail_batches={"agent_logs"}, bad_actions={"a", "b"})
+    writer = _install(monkeypatch, db)
+
+    writer._write([_log_row("a"), _log_row("b"), _query_row("q")])
+
+    assert db.batches == [("nl_queries", [{"query_text": "q", "success": True}])]
+    assert db.rows == []
+
+
+def test_failed_copy_retried_row_by_row(monkeypatch):
+    db = _FakeDatabase(fail_batches={"agent_logs"}, bad_actions={"7"})
+    writer = _install(monkeypatch, db)
+
+    writer._write([_log_row(str(i)) for i in range(COPY_MIN_ROWS)])
+
+    assert db.copies == []
+    assert len(db.rows) == COPY_MIN_ROWS - 1
+    assert "7" not in [row["action"] for row in db.rows]
+
+
+def test_large_agent_log_batch_uses_copy(monkeypatch):
+    db = _FakeDatabase()
+    writer = _install(monkeypatch, db)
+
+    writer._write([_log_row(str(i)) for i in range(COPY_MIN_ROWS)])
+
+    assert [(table, len(rows)) for table, rows in db.copies] == [("agent_logs", COPY_MIN_ROWS)]
+    assert db.batches == []
+
+
+def test_single_failed_row_is_logged_and_dropped(monkeypatch, caplog):
+    db = _FakeDatabase(fail_batches={"nl_queries"})
+    writer = _install(monkeypatch, db)
+
+    with caplog.at_level(logging.ERROR, logger="agent_logs"):
+        writer._write([_query_row("q")])
+
+    # A one-row batch is not retried
+    assert db.rows == []
+    assert "Dropped nl_queries row" in caplog.text
@@ -0,0 +1,330 @@
+"""
+Unit tests for the in-process and persistent caches.
+
+No database or Azure OpenAI access is needed; run with `pytest test_caches.py`.
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+# Settings require these; nothing here talks to Azure
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+
+import app.cache as cache_module
+from app.cache import LLMResponseCache, TTLCache
+from app.llm_engine import ResponseCache
+from app.agentflow_crm import AgentFlowSolver, Executor, Planner, SQLCache, Verifier
+import app.agentflow_solver as solver_module
+from app.agentflow_solver import CRMAnalyticsTool
+
+
+LLM_ERROR = "[LLM Unavailable - Error: rate limited]"
+
+
+class _Clock:
+    """Stand-in for time.monotonic / time.time that tests can advance."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# ============================================
+# SQLCache / Planner (NL→SQL cache poisoning)
+# ============================================
+
+class _FakeLLM:
+    def __init__(self, response: str):
+        self.response = response
+
+    def generate(self, prompt, system_prompt=None, **kwargs):
+        return self.response
+
+    async def agenerate(self, prompt, system_prompt=None, **kwargs):
+        return self.response
+
+
+class _FakeDatabaseTool:
+    schema_context = "leads(id, name)"
+    executors = {}
+
+    def __init__(self, result):
+        self.result = result
+
+    async def execute_async(self, command):
+        return self.result
+
+
+def _planner(response: str, result=None, cache=None) -> Planner:
+    tools = {"crm_database_query": _FakeDatabaseTool(result or {"success": True})}
+    return Planner(_FakeLLM(response), tools, verbose=False, sql_cache=cache or SQLCache())
+
+
+def _solver(planner: Planner) -> AgentFlowSolver:
+    solver = AgentFlowSolver.__new__(AgentFlowSolver)
+    solver.max_steps = 1
+    solver.max_time = 30
+    solver.verbose = False
+    solver.tools = planner.tools
+    solver.sql_cache = planner.sql_cache
+    solver.planner = planner
+    solver.executor = Executor(planner.tools, verbose=False)
+    solver.verifier = Verifier(planner.llm, verbose=False)
+    return solver
+
+
+def test_sql_cache_normalizes_questions():
+    cache = SQLCache()
+    cache.put("  Show ALL   leads ", "SELECT * FROM leads;")
+
+    assert cache.get("show all leads") == "SELECT * FROM leads;"
+    assert cache.get("show all contacts") is None
+
+
+def test_sql_cache_evicts_least_recently_used():
+    cache = SQLCache(max_size=2)
+    cache.put("a", "SELECT 1;")
+    cache.put("b", "SELECT 2;")
+    cache.get("a")
+    cache.put("c", "SELECT 3;")
+
+    assert cache.get("a") == "SELECT 1;"
+    assert cache.get("b") is None
+    assert cache.get("c") == "SELECT 3;"
+
+
+def test_sql_cache_invalidated_by_schema_change():
+    cache = SQLCache()
+    cache.set_schema_version("v1")
+    cache.put("show all leads", "SELECT * FROM leads;")
+
+    cache.set_schema_version("v1")
+    assert cache.get("show all leads") == "SELECT * FROM leads;"
+
+    cache.set_schema_version("v2")
+    assert cache.get("show all leads") is None
+
+
+def test_planner_does_not_cache_generated_sql():
+    planner = _planner(LLM_ERROR)
+
+    assert planner.generate_sql("show all leads") == LLM_ERROR + ";"
+    assert planner.sql_cache.get("show all leads") is None
+
+    planner.plan("show all leads")
+    assert planner.sql_cache.get("show all leads") is None
+
+
+def test_cache_sql_rejects_llm_errors_and_empty_sql():
+    planner = _planner("")
+
+    planner.cache_sql("show all leads", LLM_ERROR)
+    planner.cache_sql("show all leads", "")
+    assert planner.sql_cache.get("show all leads") is None
+
+    planner.cache_sql("show all leads", "SELECT * FROM leads;")
+    assert planner.sql_cache.get("show all leads") == "SELECT * FROM leads;"
+
+
+def test_solver_caches_only_sql_that_ran():
+    plan = '{"intent": "list leads", "sql": "SELECT * FROM leads"}'
+
+    failed = _planner(plan, result={"success": False, "error": "relation does not exist"})
+    result = asyncio.run(_solver(failed).solve_async("show all leads"))
+    assert not result["success"]
+    assert failed.sql_cache.get("show all leads") is None
+
+    succeeded = _planner(plan, result={"success": True, "result_count": 1, "results": [{"id": 1, "name": "a"}]})
+    result = asyncio.run(_solver(succeeded).solve_async("show all leads"))
+    assert result["success"]
+    assert succeeded.sql_cache.get("show all leads") == "SELECT * FROM leads;"
+
+
+# ============================================
+# ResponseCache (llm_engine)
+# ============================================
+
+def test_response_cache_keys_on_system_prompt_and_max_tokens():
+    cache = ResponseCache()
+    cache.put("system", 100, "What is the pipeline?", "answer")
+
+    assert cache.get("system", 100, "  what is the PIPELINE? ") == "answer"
+    assert cache.get("other system", 100, "What is the pipeline?") is None
+    assert cache.get("system", 200, "What is the pipeline?") is None
+
+
+def test_response_cache_entries_expire(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr("app.llm_engine.time.monotonic", clock)
+    cache = ResponseCache(ttl=10)
+    cache.put(None, 100, "prompt", "answer")
+
+    clock.now += 9
+    assert cache.get(None, 100, "prompt") == "answer"
+    clock.now += 2
+    assert cache.get(None, 100, "prompt") is None
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put(None, 100, "a", 1)
+    cache.put(None, 100, "b", 2)
+    cache.get(None, 100, "a")
+    cache.put(None, 100, "c", 3)
+
+    assert cache.get(None, 100, "a") == 1
+    assert cache.get(None, 100, "b") is None
+
+
+# ============================================
+# LLMResponseCache (persistent SQLite cache)
+# ============================================
+
+def test_llm_response_cache_off_by_default(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"))
+    key = LLMResponseCache.make_key("system", "prompt")
+    cache.put(key, "analyze", "response")
+
+    assert cache.get(key) is None
+    assert not (tmp_path / "llm_cache.sqlite").exists()
+
+
+def test_llm_response_cache_modes(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    key = LLMResponseCache.make_key("system", "prompt")
+
+    writer = LLMResponseCache(path, mode="write")
+    writer.put(key, "analyze", "response")
+    assert writer.get(key) is None
+
+    assert LLMResponseCache(path, mode="read").get(key) == "response"
+    assert LLMResponseCache(path, mode="bogus").get(key) is None
+
+
+def test_llm_response_cache_expires_old_entries(tmp_path, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"), mode="replay", max_age=60)
+    key = LLMResponseCache.make_key("system", "prompt")
+    cache.put(key, "analyze", "response")
+
+    clock.now += 59
+    assert cache.get(key) == "response"
+    clock.now += 2
+    assert cache.get(key) is None
+
+
+def test_llm_response_cache_prunes_to_max_entries(tmp_path, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    monkeypatch.setattr(cache_module, "PRUNE_EVERY", 5)
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"), mode="replay", max_entries=3)
+
+    keys = [LLMResponseCache.make_key(str(i)) for i in range(5)]
+    for i, key in enumerate(keys):
+        clock.now += 1
+        cache.put(key, "analyze", f"response {i}")
+
+    count = cache._connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+    assert count == 3
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) == "response 4"
+
+
+# ============================================
+# TTLCache (context rows)
+# ============================================
+
+def test_ttl_cache_matches_uuid_and_string_keys():
+    cache = TTLCache()
+    key = uuid.uuid4()
+    cache.put(key, {"name": "Acme"})
+
+    assert cache.get(str(key)) == {"name": "Acme"}
+
+
+def test_ttl_cache_expiry_and_invalidate(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    cache = TTLCache(ttl=30)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    clock.now += 31
+    assert cache.get("b") is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+# ============================================
+# CRM_Analytics (lru_cache per TTL window)
+# ============================================
+
+def _fake_analytics_db(monkeypatch, rollup_present=False, rollup_rows=None):
+    calls = []
+
+    def execute_query(query, params):
+        calls.append(query)
+        if "to_regclass" in query:
+            return [{"present": rollup_present}]
+        if "crm_analytics_rollup" in query:
+            return rollup_rows or []
+        return [{"total_value": 100, "deal_count": 2}]
+
+    monkeypatch.setattr(solver_module, "execute_query", execute_query)
+    solver_module._rollup_available.cache_clear()
+    solver_module._compute_pipeline_value.cache_clear()
+    return calls
+
+
+def test_analytics_results_are_copies_of_the_cached_value(monkeypatch):
+    calls = _fake_analytics_db(monkeypatch)
+    tool = CRMAnalyticsTool()
+
+    first = tool.execute(metric="pipeline_value")
+    first["value"]["total_value"] = -1
+    second = tool.execute(metric="pipeline_value")
+
+    assert second["value"]["total_value"] == 100
+    assert sum("FROM opportunities" in q for q in calls) == 1
+
+
+def test_analytics_ignores_stale_rollup(monkeypatch):
+    # The freshness filter leaves no rollup row, so the live query answers
+    calls = _fake_analytics_db(monkeypatch, rollup_present=True, rollup_rows=[])
+
+    result = CRMAnalyticsTool().execute(metric="pipeline_value")
+
+    assert result["value"] == {"total_value": 100, "deal_count": 2}
+    assert any("refreshed_at" in q for q in calls)
+    assert any("FROM opportunities" in q for q in calls)
+
+
+def test_analytics_uses_fresh_rollup(monkeypatch):
+    calls = _fake_analytics_db(monkeypatch, rollup_present=True, rollup_rows=[{"total_value": 7, "deal_count": 1}])
+
+    result = CRMAnalyticsTool().execute(metric="pipeline_value")
+
+    assert result["value"] == {"total_value": 7, "deal_count": 1}
+    assert not any("FROM opportunities" in q for q in calls)
@@ -0,0 +1,148 @@
+"""
+Unit tests for SQL row capping and the pure planning helpers.
+
+No database or Azure OpenAI access is needed; run with `pytest test_sql_helpers.py`.
+"""
+
+import os
+import sys
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+# Settings require these; nothing here talks to Azure
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+
+from app.database import limit_rows
+from app.agentflow_crm import CRMDatabaseTool, MAX_RESULT_ROWS
+from app.agentflow_solver import AgentFlowCRMSolver, Planner
+from app.agents.nl_query_agent import NLQueryAgent, SQL_HOT_LEADS, SQL_PIPELINE_BY_STAGE
+
+
+# ============================================
+# limit_rows
+# ============================================
+
+def test_limit_rows_wraps_uncapped_query():
+    assert limit_rows("SELECT * FROM leads", 500) == "SELECT * FROM (\nSELECT * FROM leads\n) _capped LIMIT 500"
+
+
+def test_limit_rows_survives_trailing_comment():
+    capped = limit_rows("SELECT * FROM leads -- newest first", 500)
+
+    # The comment ends at its own newline, so the cap is still applied
+    assert capped.endswith("\n) _capped LIMIT 500")
+    assert "-- newest first\n" in capped
+
+
+def test_limit_rows_keeps_existing_trailing_limit():
+    assert limit_rows("SELECT * FROM leads LIMIT 5;", 500) == "SELECT * FROM leads LIMIT 5"
+    assert limit_rows("SELECT * FROM leads limit 5 offset 10", 500) == "SELECT * FROM leads limit 5 offset 10"
+
+
+def test_limit_rows_caps_query_with_limit_only_in_subquery():
+    query = "SELECT * FROM leads WHERE id IN (SELECT lead_id FROM activities LIMIT 5)"
+
+    assert limit_rows(query, 500) == f"SELECT * FROM (\n{query}\n) _capped LIMIT 500"
+
+
+def test_limit_rows_strips_trailing_semicolon():
+    assert limit_rows("SELECT * FROM leads;  ", 10) == "SELECT * FROM (\nSELECT * FROM leads\n) _capped LIMIT 10"
+
+
+def test_database_tool_fetches_one_extra_row():
+    assert CRMDatabaseTool._bound("SELECT * FROM leads").endswith(f"LIMIT {MAX_RESULT_ROWS + 1}")
+
+
+# ============================================
+# NLQueryAgent._pattern_sql
+# ============================================
+
+def test_pattern_sql_matches_whole_stock_questions():
+    agent = NLQueryAgent.__new__(NLQueryAgent)
+
+    assert agent._pattern_sql("Show me all the hot leads?") == SQL_HOT_LEADS
+    assert agent._pattern_sql("  what is the total pipeline value by stage ") == SQL_PIPELINE_BY_STAGE
+
+
+def test_pattern_sql_ignores_partial_matches():
+    agent = NLQueryAgent.__new__(NLQueryAgent)
+
+    assert agent._pattern_sql("show me hot leads from last week") is None
+    assert agent._pattern_sql("why are hot leads stalling") is None
+
+
+# ============================================
+# Planner.extract_verify_and_plan
+# ============================================
+
+def _planner() -> Planner:
+    tools = ["CRM_Database_Query", "CRM_Analytics", "CRM_Reasoning"]
+    return Planner({}, tools, verbose=False, tool_descriptions=("", ""))
+
+
+def test_extract_verify_and_plan_stop():
+    response = """ANALYSIS: The query returned all hot leads.
+CONCLUSION: STOP"""
+
+    assert _planner().extract_verify_and_plan(response) == (
+        "The query returned all hot leads.", "STOP", "", "", None
+    )
+
+
+def test_extract_verify_and_plan_continue():
+    response = """ANALYSIS: We have leads but no pipeline value yet.
+CONCLUSION: CONTINUE
+CONTEXT: Hot leads are known
+SUB_GOAL: Compute the pipeline value
+TOOL: crm_analytics"""
+
+    assert _planner().extract_verify_and_plan(response) == (
+        "We have leads but no pipeline value yet.", "CONTINUE",
+        "Hot leads are known", "Compute the pipeline value", "CRM_Analytics"
+    )
+
+
+def test_extract_verify_and_plan_defaults_to_continue():
+    analysis, conclusion, _, _, tool = _planner().extract_verify_and_plan("TOOL: none")
+
+    assert (analysis, conclusion, tool) == ("", "CONTINUE", None)
+
+
+# ============================================
+# AgentFlowCRMSolver._heuristic_conclusion
+# ============================================
+
+def _solver(max_steps: int = 10) -> AgentFlowCRMSolver:
+    solver = AgentFlowCRMSolver.__new__(AgentFlowCRMSolver)
+    solver.max_steps = max_steps
+    return solver
+
+
+def test_heuristic_conclusion_stops_on_step_budget():
+    result = {"success": False}
+
+    assert _solver(max_steps=3)._heuristic_conclusion("show leads", "CRM_Database_Query", result, 2) == (
+        "STOP", "Step budget reached"
+    )
+
+
+def test_heuristic_conclusion_retries_early_failures_only():
+    result = {"success": False, "error": "syntax error"}
+    solver = _solver()
+
+    assert solver._heuristic_conclusion("show leads", "CRM_Database_Query", result, 1)[0] == "CONTINUE"
+    assert solver._heuristic_conclusion("show leads", "CRM_Database_Query", result, 2) is None
+
+
+def test_heuristic_conclusion_stops_single_intent_data_queries():
+    result = {"success": True, "result_count": 4}
+    solver = _solver()
+
+    assert solver._heuristic_conclusion("show hot leads", "CRM_Database_Query", result, 1)[0] == "STOP"
+    assert solver._heuristic_conclusion("show hot leads and explain why", "CRM_Database_Query", result, 1) is None
+    assert solver._heuristic_conclusion("show hot leads", "CRM_Reasoning", result, 1) is None
+    assert solver._heuristic_conclusion(
+        "show hot leads", "CRM_Database_Query", {"success": True, "result_count": 0}, 1
+    ) is None
@@ -0,0 +1,113 @@
+-- ============================================
+-- Agentic CRM - Precomputed Analytics Views
+-- Materialized aggregates for the most common NL queries.
+-- Run after init_schema.sql; safe to re-run.
+-- ============================================
+
+-- Lead counts by status
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_lead_counts_by_status AS
+SELECT
+    COALESCE(lead_status, 'Unknown') AS lead_status,
+    COUNT(*) AS lead_count,
+    ROUND(AVG(ai_score), 1) AS avg_ai_score
+FROM leads
+GROUP BY COALESCE(lead_status, 'Unknown');
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_lead_counts_by_status ON mv_lead_counts_by_status(lead_status);
+
+-- Opportunity pipeline by stage
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_opp_pipeline_by_stage AS
+SELECT
+    COALESCE(stage, 'Unknown') AS stage,
+    COUNT(*) AS deal_count,
+    COUNT(*) FILTER (WHERE is_closed = FALSE) AS open_deal_count,
+    COALESCE(SUM(amount), 0) AS total_amount,
+    COALESCE(SUM(amount) FILTER (WHERE is_closed = FALSE), 0) AS open_amount,
+    COALESCE(SUM(amount * probability / 100.0), 0) AS weighted_amount,
+    ROUND(AVG(probability), 1) AS avg_probability
+FROM opportunities
+GROUP BY COALESCE(stage, 'Unknown');
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_opp_pipeline_by_stage ON mv_opp_pipeline_by_stage(stage);
+
+-- Account revenue by industry
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_account_revenue_by_industry AS
+SELECT
+    COALESCE(industry, 'Unknown') AS industry,
+    COUNT(*) AS account_count,
+    COALESCE(SUM(annual_revenue), 0) AS total_revenue,
+    ROUND(AVG(annual_revenue), 2) AS avg_revenue
+FROM accounts
+GROUP BY COALESCE(industry, 'Unknown');
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_account_revenue_by_industry ON mv_account_revenue_by_industry(industry);
+
+-- Single-row rollup of the CRM_Analytics metrics (pipeline value, win rate,
+-- lead conversion); rollup_id is a constant key for CONCURRENTLY refreshes.
+-- refreshed_at is stamped at refresh time: the backend only reads a rollup
+-- refreshed within its 60 s metric TTL and runs the live query otherwise.
+-- Rollups created before refreshed_at existed are rebuilt.
+DO $$
+BEGIN
+    IF to_regclass('crm_analytics_rollup') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = 'crm_analytics_rollup'::regclass AND attname = 'refreshed_at'
+    ) THEN
+        DROP MATERIALIZED VIEW crm_analytics_rollup;
+    END IF;
+END $$;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS crm_analytics_rollup AS
+SELECT
+    1 AS rollup_id,
+    NOW() AS refreshed_at,
+    o.pipeline_value,
+    o.open_deal_count,
+    o.won_count,
+    o.closed_count,
+    l.converted_count,
+    l.lead_count
+FROM (
+    SELECT
+        SUM(amount) FILTER (WHERE is_closed = FALSE) AS pipeline_value,
+        COUNT(*) FILTER (WHERE is_closed = FALSE) AS open_deal_count,
+        COUNT(*) FILTER (WHERE is_won = TRUE) AS won_count,
+        COUNT(*) FILTER (WHERE is_closed = TRUE) AS closed_count
+    FROM opportunities
+) o
+CROSS JOIN (
+    SELECT
+        COUNT(*) FILTER (WHERE lead_status = 'converted') AS converted_count,
+        COUNT(*) AS lead_count
+    FROM leads
+) l;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_crm_analytics_rollup ON crm_analytics_rollup(rollup_id);
+
+-- Refresh the views every 5 minutes and the metrics rollup every minute when
+-- pg_cron is available (otherwise schedule the REFRESH statements externally;
+-- without a refresh the backend computes the metrics live)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'refresh-crm-analytics-views',
+            '*/5 * * * *',
+            $cron$
+            REFRESH MATERIALIZED VIEW CONCURRENTLY mv_lead_counts_by_status;
+            REFRESH MATERIALIZED VIEW CONCURRENTLY mv_opp_pipeline_by_stage;
+            REFRESH MATERIALIZED VIEW CONCURRENTLY mv_account_revenue_by_industry;
+            $cron$
+        );
+        PERFORM cron.schedule(
+            'refresh-crm-analytics-rollup',
+            '* * * * *',
+            'REFRESH MATERIALIZED VIEW CONCURRENTLY crm_analytics_rollup'
+        );
+    END IF;
+END $$;
+
+COMMENT ON MATERIALIZED VIEW mv_lead_counts_by_status IS 'Lead counts per status, refreshed every 5 minutes';
+COMMENT ON MATERIALIZED VIEW mv_opp_pipeline_by_stage IS 'Opportunity pipeline totals per stage, refreshed every 5 minutes';
+COMMENT ON MATERIALIZED VIEW mv_account_revenue_by_industry IS 'Account revenue per industry, refreshed every 5 minutes';
+COMMENT ON MATERIALIZED VIEW crm_analytics_rollup IS 'Single-row CRM_Analytics metrics rollup, refreshed every minute (read only while fresh)';
@@ -24,6 +24,9 @@ BEGIN
     END IF;
 END $$;
 
+-- Follow-up scan: open leads by status and due follow-up time
+CREATE INDEX IF NOT EXISTS idx_leads_followup ON leads(lead_status, is_converted, next_followup_at) WHERE is_converted = FALSE;
+
 -- Add AI fields to opportunities
 DO $$ 
 BEGIN
@@ -35,6 +38,9 @@ BEGIN
     END IF;
 END $$;
 
+-- Open opportunities by primary contact (contact context lookups)
+CREATE INDEX IF NOT EXISTS idx_opportunities_contact_open ON opportunities(primary_contact_id) WHERE is_closed = FALSE;
+
 -- Add AI fields to activities
 DO $$ 
 BEGIN
@@ -43,6 +49,12 @@ BEGIN
     END IF;
 END $$;
 
+-- Activity lookups: latest activity per record, recent activity feed,
+-- follow-up analytics by due date
+CREATE INDEX IF NOT EXISTS idx_activities_related_created ON activities(related_to_type, related_to_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_activities_created ON activities(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_activities_due_date ON activities(due_date);
+
 -- ============================================
 -- NEW AI-SPECIFIC TABLES
 -- ============================================
@@ -84,6 +96,17 @@ CREATE TABLE IF NOT EXISTS nl_queries (
 CREATE INDEX IF NOT EXISTS idx_nl_queries_user ON nl_queries(user_id);
 CREATE INDEX IF NOT EXISTS idx_nl_queries_created ON nl_queries(created_at DESC);
 
+-- SQL-generation token usage (cached_tokens = prompt-cache hits)
+DO $$ 
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'nl_queries' AND column_name = 'prompt_tokens') THEN
+        ALTER TABLE nl_queries ADD COLUMN prompt_tokens INTEGER;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'nl_queries' AND column_name = 'cached_tokens') THEN
+        ALTER TABLE nl_queries ADD COLUMN cached_tokens INTEGER;
+    END IF;
+END $$;
+
 -- Pipeline AI predictions
 CREATE TABLE IF NOT EXISTS pipeline_predictions (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -318,6 +318,7 @@ function ReasoningStepsView({ steps, executionTime, stepCount }: {
                 return <Sparkles size={14} color="var(--color-accent-warning)" />;
             case 'command_generation':
             case 'execution':
+            case 'fast_path':
                 return <Wrench size={14} color="var(--color-accent-secondary)" />;
             case 'verification':
                 return <CheckCircle size={14} color="var(--color-accent-success)" />;
@@ -333,7 +334,8 @@ function ReasoningStepsView({ steps, executionTime, stepCount }: {
             case 'analysis': return 'rgba(99, 102, 241, 0.15)';
             case 'planning': return 'rgba(245, 158, 11, 0.15)';
             case 'command_generation':
-            case 'execution': return 'rgba(34, 211, 238, 0.15)';
+            case 'execution':
+            case 'fast_path': return 'rgba(34, 211, 238, 0.15)';
             case 'verification': return 'rgba(34, 197, 94, 0.15)';
             case 'final_output': return 'rgba(99, 102, 241, 0.2)';
             default: return 'var(--color-bg-tertiary)';